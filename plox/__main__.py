@@ -1,17 +1,151 @@
+import argparse
+import json
+import signal
 import sys
+import time
 
+from . import batch
+from . import cache
 from . import lox
+from . import natives
+from .memo import MEMO_SIZE, Memoizer
+from .profiler import Profile
+from .sampler import Sampler
 
 
-def main():
-    args = sys.argv[1:]
-    if len(args) > 1:
-        print("Usage: plox [script]")
+class ArgumentParser(argparse.ArgumentParser):
+    def error(self, message):
+        self.print_usage()
         sys.exit(64)
-    elif len(args) == 1:
-        lox.run_file(args[0])
+
+
+def load_plugins(parser, plugins):
+    for plugin in plugins:
+        try:
+            natives.load_plugin(plugin)
+        except (ImportError, OSError) as exc:
+            parser.error(f"can't load plugin {plugin}: {exc}")
+
+
+def batch_main(argv):
+    parser = ArgumentParser(prog="plox batch")
+    parser.add_argument("scripts", nargs="*", metavar="script")
+    parser.add_argument("--manifest", metavar="PATH", help="a file listing scripts")
+    parser.add_argument(
+        "--engine", choices=sorted(lox.ENGINES), default=lox.DEFAULT_ENGINE
+    )
+    parser.add_argument(
+        "-O", dest="optimize", type=int, choices=[0, 1], default=lox.DEFAULT_OPTIMIZE
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    parser.add_argument("--timeout", metavar="SECONDS", type=float)
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--plugin", action="append", default=[], metavar="MODULE")
+    args = parser.parse_args(argv)
+    load_plugins(parser, args.plugin)
+    scripts = args.scripts
+    if args.manifest is not None:
+        scripts += batch.read_manifest(args.manifest)
+    if not scripts:
+        parser.error("no scripts to run")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    start = time.perf_counter()
+    results = batch.run_batch(
+        scripts,
+        args.jobs,
+        args.timeout,
+        args.engine,
+        not args.no_cache,
+        args.optimize,
+        args.plugin,
+    )
+    batch.report(results, time.perf_counter() - start)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if any(result["status"] != 0 for result in results):
+        sys.exit(1)
+
+
+def main():
+    if sys.argv[1:2] == ["batch"]:
+        batch_main(sys.argv[2:])
+        return
+    parser = ArgumentParser(prog="plox")
+    parser.add_argument("script", nargs="?")
+    parser.add_argument(
+        "--engine", choices=sorted(lox.ENGINES), default=lox.DEFAULT_ENGINE
+    )
+    parser.add_argument(
+        "-O", dest="optimize", type=int, choices=[0, 1], default=lox.DEFAULT_OPTIMIZE
+    )
+    parser.add_argument("--emit-python", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--clear-cache", action="store_true")
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-json", metavar="PATH")
+    parser.add_argument("--sample", metavar="PATH")
+    parser.add_argument("--sample-rate", metavar="HZ", type=int, default=1000)
+    parser.add_argument("--plugin", action="append", default=[], metavar="MODULE")
+    parser.add_argument(
+        "--memoize", action="store_true", help="cache the results of pure functions"
+    )
+    parser.add_argument(
+        "--memo-size",
+        metavar="SIZE",
+        type=int,
+        help=f"results cached per function (default {MEMO_SIZE})",
+    )
+    parser.add_argument("--memo-stats", action="store_true")
+    args = parser.parse_args()
+    load_plugins(parser, args.plugin)
+    profile = None
+    if args.profile or args.profile_json or args.sample:
+        if args.engine != "tree":
+            parser.error("profiling needs the tree engine")
+        if args.sample is None:
+            profile = Profile(args.profile_json)
+        elif args.profile or args.profile_json:
+            parser.error("--sample can't be combined with --profile")
+        elif not hasattr(signal, "setitimer"):
+            parser.error("--sample needs interval timers, which this platform lacks")
+        else:
+            profile = Sampler(args.sample, args.sample_rate)
+    memoizer = None
+    if args.memoize or args.memo_size is not None or args.memo_stats:
+        if args.engine not in lox.MEMO_ENGINES:
+            parser.error(f"--memoize needs a {'/'.join(lox.MEMO_ENGINES)} engine")
+        if profile is not None:
+            parser.error("--memoize can't be combined with profiling")
+        if args.memo_size is not None and args.memo_size < 1:
+            parser.error("--memo-size must be at least 1")
+        memoizer = Memoizer(args.memo_size or MEMO_SIZE)
+    if args.clear_cache:
+        cache.clear(args.script or "")
+        if args.script is None:
+            return
+    if args.emit_python:
+        if args.script is None:
+            parser.error("--emit-python needs a script")
+        lox.emit_python(args.script, args.optimize)
+    elif args.script is not None:
+        try:
+            lox.run_file(
+                args.script,
+                args.engine,
+                not args.no_cache,
+                args.optimize,
+                profile,
+                memoizer,
+            )
+        finally:
+            if args.memo_stats:
+                memoizer.report()
     else:
-        lox.run_prompt()
+        lox.run_prompt(args.engine, args.optimize)
 
 
 if __name__ == "__main__":
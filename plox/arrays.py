@@ -0,0 +1,171 @@
+from array import array
+from functools import partial
+from itertools import repeat
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .callable import Callable
+from .natives import NativeError, NativeFunction, count_params, register
+
+
+# Below this length elementwise operations are quicker in Python than through
+# NumPy. NumPy is only used for them, where it gives the same results bit for
+# bit, and not for sums, whose order of addition it changes.
+NUMPY_MIN_LENGTH = 64
+
+
+def number_text(value):
+    text = str(value)
+    return text[:-2] if text.endswith(".0") else text
+
+
+def is_number(value):
+    return type(value) is float or type(value) is int
+
+
+def to_index(value, stop):
+    if type(value) is not float or not value.is_integer():
+        raise NativeError("Array index must be an integer.")
+    if not 0 <= value < stop:
+        raise NativeError("Array index out of range.")
+    return int(value)
+
+
+def to_data(values):
+    for value in values:
+        if not is_number(value):
+            raise NativeError("Array elements must be numbers.")
+    return array("d", values)
+
+
+def callback(function, interpreter):
+    # A Python function calling a Lox function with one argument
+    native_callback = getattr(interpreter, "native_callback", None)
+    if native_callback is not None:
+        # The VM, which runs the function on its own stack
+        return native_callback(function, 1)
+    if isinstance(function, Callable):
+        if function.arity() != 1:
+            raise NativeError(f"Expected {function.arity()} arguments but got 1.")
+        return lambda value: function.call(interpreter, [value])
+    if callable(function):
+        # The python engine's functions and classes are Python ones
+        try:
+            arity = count_params(function)
+        except TypeError:
+            # A native, which checks its own arity
+            arity = 1
+        if arity != 1:
+            raise NativeError(f"Expected {arity} arguments but got 1.")
+        return function
+    raise NativeError("Can only call functions and classes.")
+
+
+# A fixed length array of numbers. Its methods are the Python methods named
+# a_<name>: the python engine looks Lox properties up as such attributes, and
+# the other engines call them as natives bound to the array. Work on whole
+# arrays happens in Python, or in NumPy when it is installed, rather than in
+# the interpreter loop.
+class LoxArray:
+    __slots__ = ("data", "methods")
+
+    def __init__(self, data):
+        self.data = data
+        self.methods = {}
+
+    def __str__(self):
+        return "[" + ", ".join(map(number_text, self.data)) + "]"
+
+    def method(self, name):
+        native = self.methods.get(name)
+        if native is None:
+            function = getattr(LoxArray, f"a_{name}", None)
+            if function is None:
+                return None
+            code = function.__code__
+            native = NativeFunction(
+                name,
+                partial(function, self),
+                code.co_argcount - 1,
+                callback=bool(code.co_kwonlyargcount),
+            )
+            self.methods[name] = native
+        return native
+
+    def elementwise(self, op, other):
+        data = self.data
+        if type(other) is LoxArray:
+            if len(other.data) != len(data):
+                raise NativeError("Arrays must have the same length.")
+            other = other.data
+        elif type(other) is not float:
+            raise NativeError("Operand must be a number or an array.")
+        if numpy is not None and len(data) >= NUMPY_MIN_LENGTH:
+            if type(other) is array:
+                other = numpy.frombuffer(other, dtype=numpy.float64)
+            result = op(numpy.frombuffer(data, dtype=numpy.float64), other)
+            return LoxArray(array("d", result.tobytes()))
+        if type(other) is float:
+            other = repeat(other)
+        return LoxArray(array("d", map(op, data, other)))
+
+    def a_length(self):
+        return float(len(self.data))
+
+    def a_get(self, index):
+        return self.data[to_index(index, len(self.data))]
+
+    def a_set(self, index, value):
+        if not is_number(value):
+            raise NativeError("Array elements must be numbers.")
+        self.data[to_index(index, len(self.data))] = value
+        return value
+
+    def a_slice(self, start, end):
+        start = to_index(start, len(self.data) + 1)
+        end = to_index(end, len(self.data) + 1)
+        return LoxArray(self.data[start : max(start, end)])
+
+    def a_map(self, function, *, interpreter=None):
+        call = callback(function, interpreter)
+        return LoxArray(to_data([call(value) for value in self.data]))
+
+    def a_sum(self):
+        return sum(self.data, 0.0)
+
+    def a_dot(self, other):
+        if type(other) is not LoxArray:
+            raise NativeError("Operand must be an array.")
+        if len(other.data) != len(self.data):
+            raise NativeError("Arrays must have the same length.")
+        return sum(map(operator.mul, self.data, other.data), 0.0)
+
+    def a_add(self, other):
+        return self.elementwise(operator.add, other)
+
+    def a_sub(self, other):
+        return self.elementwise(operator.sub, other)
+
+    def a_mul(self, other):
+        return self.elementwise(operator.mul, other)
+
+    def a_div(self, other):
+        if type(other) is float and other == 0.0:
+            raise NativeError("Division by zero")
+        if type(other) is LoxArray and 0.0 in other.data:
+            raise NativeError("Division by zero")
+        return self.elementwise(operator.truediv, other)
+
+
+def new_array(length):
+    # A new array of the given length, filled with zeros
+    if type(length) is not float or not length.is_integer() or length < 0:
+        raise NativeError("Array length must be a non-negative integer.")
+    return LoxArray(array("d", bytes(8 * int(length))))
+
+
+register("Array", new_array, 1)
@@ -0,0 +1,170 @@
+from collections import Counter, deque
+import contextlib
+import io
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import time
+import traceback
+
+from . import lox
+from .natives import load_plugin
+
+
+def run_job(path, engine, use_cache, optimize):
+    # Runs one script as lox.run_file would from the command line, keeping
+    # what it prints and the status it exits with
+    output = io.StringIO()
+    status = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        try:
+            lox.run_file(path, engine, use_cache, optimize)
+        except SystemExit as exc:
+            status = exc.code
+        except OSError as exc:
+            print(exc)
+            status = 66
+        except Exception:
+            traceback.print_exc(file=output)
+            status = 1
+    return status, output.getvalue(), time.perf_counter() - start
+
+
+def serve(conn, engine, use_cache, optimize, plugins):
+    # Workers import plox and the plugins once and then run scripts until they
+    # are sent None
+    for plugin in plugins:
+        load_plugin(plugin)
+    while (path := conn.recv()) is not None:
+        conn.send(run_job(path, engine, use_cache, optimize))
+
+
+class Worker:
+    def __init__(self, context, options):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(
+            target=serve, args=(child, *options), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.index = None
+        self.started = None
+        self.deadline = None
+
+    def start(self, index, path, timeout):
+        self.index = index
+        self.started = time.monotonic()
+        self.deadline = None if timeout is None else self.started + timeout
+        self.conn.send(path)
+
+    def stop(self):
+        # Closing the pipe is not enough, as workers forked later hold copies
+        # of its end
+        self.conn.send(None)
+        self.process.join()
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+def result(path, status, output, elapsed):
+    return {"path": path, "status": status, "output": output, "time": elapsed}
+
+
+# Runs scripts on a pool of worker processes, one script per worker at a time.
+# A worker whose script runs past the timeout is killed and replaced, as is
+# one that dies. Results come back in the order of the paths, with a status of
+# "timeout" or "crash" for scripts that did not exit.
+def run_batch(
+    paths,
+    jobs=None,
+    timeout=None,
+    engine=lox.DEFAULT_ENGINE,
+    use_cache=True,
+    optimize=lox.DEFAULT_OPTIMIZE,
+    plugins=(),
+):
+    context = multiprocessing.get_context()
+    options = (engine, use_cache, optimize, plugins)
+    results = [None] * len(paths)
+    pending = deque(enumerate(paths))
+    idle = [
+        Worker(context, options)
+        for _ in range(min(jobs or os.cpu_count() or 1, len(paths)))
+    ]
+    busy = {}
+    while pending or busy:
+        while pending and idle:
+            worker = idle.pop()
+            index, path = pending.popleft()
+            worker.start(index, path, timeout)
+            busy[worker.conn] = worker
+
+        deadlines = [w.deadline for w in busy.values() if w.deadline is not None]
+        delay = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+        for conn in wait(list(busy), delay):
+            worker = busy.pop(conn)
+            path = paths[worker.index]
+            try:
+                results[worker.index] = result(path, *conn.recv())
+            except EOFError:
+                elapsed = time.monotonic() - worker.started
+                results[worker.index] = result(path, "crash", "", elapsed)
+                worker.kill()
+                worker = Worker(context, options)
+            idle.append(worker)
+
+        now = time.monotonic()
+        for conn, worker in list(busy.items()):
+            if worker.deadline is not None and worker.deadline <= now:
+                del busy[conn]
+                worker.kill()
+                path = paths[worker.index]
+                results[worker.index] = result(path, "timeout", "", timeout)
+                idle.append(Worker(context, options))
+
+    for worker in idle:
+        worker.stop()
+    return results
+
+
+def read_manifest(path):
+    # One script per line, relative to the manifest. Blank lines and lines
+    # starting with # are skipped.
+    directory = os.path.dirname(path)
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [
+        os.path.join(directory, line)
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def describe(status):
+    if status == 0:
+        return "ok"
+    if isinstance(status, int):
+        return f"exit {status}"
+    return status
+
+
+def report(results, elapsed, out=None):
+    for res in results:
+        status = res["status"]
+        print(f"{status!s:>8}{res['time']:10.3f}s  {res['path']}", file=out)
+    counts = Counter(res["status"] for res in results)
+    script_time = sum(res["time"] for res in results)
+    summary = ", ".join(
+        f"{count} {describe(status)}"
+        for status, count in sorted(counts.items(), key=lambda item: str(item[0]))
+    )
+    print(
+        f"{len(results)} scripts in {elapsed:.3f}s"
+        f" ({script_time:.3f}s in scripts): {summary}",
+        file=out,
+    )
@@ -0,0 +1,130 @@
+import hashlib
+import marshal
+import mmap
+import os
+import shutil
+import sys
+
+from . import expr
+from . import stmt
+from .tokens import Token, TokenType
+
+
+# Bump whenever the encoding, or the annotations the Resolver leaves, change.
+# Changes to the node layout, and to the sources of plox, are picked up by
+# source_key without a bump.
+CACHE_VERSION = 3
+CACHE_DIR = "__loxcache__"
+MAGIC = b"LOXC"
+HEADER_SIZE = len(MAGIC) + hashlib.sha256().digest_size
+
+NODE_TYPES = [
+    *(cls for cls in vars(expr).values() if hasattr(cls, "fields")),
+    *(cls for cls in vars(stmt).values() if hasattr(cls, "fields")),
+]
+NODE_CODES = {cls: code for code, cls in enumerate(NODE_TYPES)}
+TOKEN = -1
+TOKEN_TYPES = list(TokenType)
+TOKEN_CODES = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+LAYOUT = repr(
+    [(cls.__name__, cls.fields) for cls in NODE_TYPES]
+    + [token_type.name for token_type in TOKEN_TYPES]
+)
+
+
+def package_digest():
+    # Any change to plox can change the tree resolve builds for a program
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+    return digest.digest()
+
+
+PACKAGE_DIGEST = package_digest()
+
+
+def cache_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIR, name + "c")
+
+
+# Programs are cached as they come out of resolve, so the optimization level
+# is part of the key.
+def source_key(source, optimize):
+    key = hashlib.sha256(
+        f"{CACHE_VERSION}:{marshal.version}:{sys.implementation.cache_tag}:"
+        f"{optimize}:".encode()
+    )
+    key.update(PACKAGE_DIGEST)
+    key.update(LAYOUT.encode())
+    key.update(source.encode())
+    return key.digest()
+
+
+# Nodes and tokens are flattened to tuples tagged with their type code and
+# lists stay lists, which marshal writes and reads natively.
+def encode(value):
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, Token):
+        return (TOKEN, TOKEN_CODES[value.type], value.lexeme, value.literal, value.line)
+    cls = type(value)
+    if cls in NODE_CODES:
+        return (NODE_CODES[cls], *(encode(getattr(value, f)) for f in cls.fields))
+    return value
+
+
+# Equal tokens decode to one shared Token, which keeps cached trees small.
+def decode(value, tokens):
+    if type(value) is list:
+        return [decode(item, tokens) for item in value]
+    if type(value) is not tuple:
+        return value
+    code = value[0]
+    if code == TOKEN:
+        token = tokens.get(value)
+        if token is None:
+            token = tokens[value] = Token(
+                TOKEN_TYPES[value[1]], value[2], value[3], value[4]
+            )
+        return token
+    cls = NODE_TYPES[code]
+    node = cls.__new__(cls)
+    for field, item in zip(cls.fields, value[1:]):
+        if type(item) is tuple or type(item) is list:
+            item = decode(item, tokens)
+        setattr(node, field, item)
+    return node
+
+
+def load(path, source, optimize):
+    try:
+        with open(cache_path(path), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:HEADER_SIZE] != MAGIC + source_key(source, optimize):
+                    return None
+                with memoryview(data)[HEADER_SIZE:] as view:
+                    payload = marshal.loads(view)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+    return decode(payload, {})
+
+
+def store(path, source, optimize, statements):
+    target = cache_path(path)
+    temp = f"{target}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(temp, "wb") as f:
+            f.write(MAGIC + source_key(source, optimize))
+            marshal.dump(encode(statements), f)
+        os.replace(temp, target)
+    except OSError:
+        pass
+
+
+def clear(path):
+    shutil.rmtree(os.path.dirname(cache_path(path)), ignore_errors=True)
@@ -1,5 +1,4 @@
 from abc import ABC, abstractmethod
-import time
 
 from .environment import Environment
 
@@ -30,37 +29,30 @@ class Function(Callable):
         return len(self.declaration.params)
 
     def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
-        for param, arg in zip(self.declaration.params, arguments):
-            environment.define(param.lexeme, arg)
+        return self.run(interpreter, self.closure, arguments)
+
+    def call_method(self, interpreter, instance, arguments):
+        closure = Environment(self.closure, 1)
+        closure.values[0] = instance
+        return self.run(interpreter, closure, arguments)
+
+    def run(self, interpreter, closure, arguments):
+        environment = Environment(closure, self.declaration.size)
+        environment.values[: len(arguments)] = arguments
         try:
             interpreter.execute_block(self.declaration.body, environment)
         except Return as ret:
             if self.is_initializer:
-                return self.closure.get_at(0, "this")
+                return closure.values[0]
             return ret.value
 
         if self.is_initializer:
-            return self.closure.get_at(0, "this")
+            return closure.values[0]
 
     def __str__(self):
         return f"<fn {self.declaration.name.lexeme}>"
 
     def bind(self, instance):
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return Function(self.declaration, environment, self.is_initializer)
-
-
-class Clock(Callable):
-    @staticmethod
-    def arity():
-        return 0
-
-    @staticmethod
-    def call(interpreter, arguments):
-        return time.time()
-
-    @staticmethod
-    def __str__():
-        return "<native fn>"
+        environment = Environment(self.closure, 1)
+        environment.values[0] = instance
+        return type(self)(self.declaration, environment, self.is_initializer)
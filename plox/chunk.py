@@ -0,0 +1,82 @@
+from array import array
+from bisect import bisect_right
+from enum import IntEnum
+
+
+OpCode = IntEnum(
+    "OpCode",
+    [
+        "CONSTANT",
+        "NIL",
+        "TRUE",
+        "FALSE",
+        "POP",
+        "GET_LOCAL",
+        "SET_LOCAL",
+        "GET_GLOBAL",
+        "DEFINE_GLOBAL",
+        "SET_GLOBAL",
+        "GET_UPVALUE",
+        "SET_UPVALUE",
+        "GET_PROPERTY",
+        "SET_PROPERTY",
+        "GET_SUPER",
+        "EQUAL",
+        "NOT_EQUAL",
+        "GREATER",
+        "GREATER_EQUAL",
+        "LESS",
+        "LESS_EQUAL",
+        "ADD",
+        "SUBTRACT",
+        "MULTIPLY",
+        "DIVIDE",
+        "NOT",
+        "NEGATE",
+        "PRINT",
+        "JUMP",
+        "JUMP_IF_FALSE",
+        "POP_JUMP_IF_FALSE",
+        "LOOP",
+        "CALL",
+        "INVOKE",
+        "SUPER_INVOKE",
+        "CLOSURE",
+        "CLOSE_UPVALUE",
+        "RETURN",
+        "CLASS",
+        "INHERIT",
+        "METHOD",
+    ],
+    start=0,
+)
+
+
+# Code is a flat array of 16 bit units: each instruction is an opcode unit
+# followed by its operand units. Lines are run-length encoded as the offsets
+# at which the line number changes.
+class Chunk:
+    def __init__(self):
+        self.code = array("H")
+        self.constants = []
+        self.constant_indices = {}
+        self.line_starts = array("I")
+        self.line_numbers = array("I")
+
+    def write(self, unit, line):
+        if not self.line_numbers or self.line_numbers[-1] != line:
+            self.line_starts.append(len(self.code))
+            self.line_numbers.append(line)
+        self.code.append(unit)
+
+    def add_constant(self, value):
+        # Floats are keyed by their repr, as -0.0 equals 0.0 but prints
+        # differently
+        key = (type(value), repr(value) if type(value) is float else value)
+        if key not in self.constant_indices:
+            self.constant_indices[key] = len(self.constants)
+            self.constants.append(value)
+        return self.constant_indices[key]
+
+    def get_line(self, offset):
+        return self.line_numbers[bisect_right(self.line_starts, offset) - 1]
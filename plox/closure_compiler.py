@@ -0,0 +1,625 @@
+from . import expr
+from .interpreter import Interpreter, RuntimeException
+from .callable import Callable
+from .environment import Environment, GlobalEnvironment
+from .lox_class import Instance, LoxClass
+from .natives import NATIVES, NativeError, NativeFunction
+from .output import Output
+from .tokens import TokenType
+
+
+check_number_operands = Interpreter.check_number_operands
+stringify = Interpreter.stringify
+array_method = Interpreter.array_method
+
+
+class CompiledFunction(Callable):
+    def __init__(self, declaration, body, closure, is_initializer):
+        self.declaration = declaration
+        self.param_count = len(declaration.params)
+        self.size = declaration.size
+        self.body = body
+        self.closure = closure
+        self.is_initializer = is_initializer
+
+    def arity(self):
+        return self.param_count
+
+    def call(self, interpreter, arguments):
+        return self.run(self.closure, arguments)
+
+    def call_method(self, interpreter, instance, arguments):
+        closure = Environment(self.closure, 1)
+        closure.values[0] = instance
+        return self.run(closure, arguments)
+
+    def run(self, closure, arguments):
+        environment = Environment(closure, self.size)
+        environment.values[: self.param_count] = arguments
+        try:
+            result = self.body(environment)
+        except RecursionError:
+            # Raised by the innermost call, or by an outer one if there is no
+            # room left to raise it in the innermost
+            raise RuntimeException(self.declaration.name, "Stack overflow.")
+        if self.is_initializer:
+            return closure.values[0]
+        if result is not None:
+            return result[0]
+
+    def __str__(self):
+        return f"<fn {self.declaration.name.lexeme}>"
+
+    def bind(self, instance):
+        environment = Environment(self.closure, 1)
+        environment.values[0] = instance
+        return CompiledFunction(
+            self.declaration, self.body, environment, self.is_initializer
+        )
+
+
+# Compiles resolved statements into nested Python closures that take the
+# current environment. Statement closures return None to fall through, or a
+# one-element tuple holding the value of a Lox return.
+class ClosureCompiler:
+    def __init__(self, output=None, memoizer=None):
+        self.output = Output() if output is None else output
+        self.memoizer = memoizer
+        self.globals = GlobalEnvironment()
+        self.globals.values.update(NATIVES)
+
+    def define_global(self, name, value):
+        self.globals.define(name, value)
+
+    def interpret(self, statements, reporter):
+        self.run_prepared(self.prepare(statements, reporter), reporter)
+
+    def prepare(self, statements, reporter):
+        return self.compile_sequence(statements)
+
+    def reset(self, code, output):
+        # Compiled code holds on to the compiler and its globals, so they are
+        # emptied rather than replaced
+        self.output = output
+        self.globals.values.clear()
+        self.globals.values.update(NATIVES)
+
+    def run_prepared(self, code, reporter):
+        try:
+            code(self.globals)
+        except RuntimeException as exc:
+            self.output.flush()
+            reporter.runtime_error(exc)
+        finally:
+            self.output.flush()
+
+    def compile(self, node):
+        return node.accept(self)
+
+    def compile_sequence(self, statements):
+        code = [self.compile(statement) for statement in statements]
+        if len(code) == 1:
+            return code[0]
+
+        def sequence(env):
+            for statement in code:
+                result = statement(env)
+                if result is not None:
+                    return result
+
+        return sequence
+
+    def compile_function(self, declaration, is_initializer):
+        body = self.compile_sequence(declaration.body)
+        return lambda env: CompiledFunction(declaration, body, env, is_initializer)
+
+    def compile_define(self, stmt):
+        slot = stmt.slot
+        if slot is None:
+            name = stmt.name.lexeme
+            values = self.globals.values
+
+            def define_global(env, value):
+                values[name] = value
+
+            return define_global
+
+        def define_local(env, value):
+            env.values[slot] = value
+
+        return define_local
+
+    def visit_block(self, stmt):
+        body = self.compile_sequence(stmt.statements)
+        size = stmt.size
+        if size is None:
+            return body
+        return lambda env: body(Environment(env, size))
+
+    def visit_class(self, stmt):
+        name = stmt.name.lexeme
+        define = self.compile_define(stmt)
+        superclass_code = superclass_name = None
+        if stmt.superclass is not None:
+            superclass_code = self.compile(stmt.superclass)
+            superclass_name = stmt.superclass.name
+        methods = [
+            (
+                method.name.lexeme,
+                self.compile_function(method, method.name.lexeme == "init"),
+            )
+            for method in stmt.methods
+        ]
+
+        def class_(env):
+            superclass = None
+            if superclass_code is not None:
+                superclass = superclass_code(env)
+                if not isinstance(superclass, LoxClass):
+                    raise RuntimeException(
+                        superclass_name, "Superclass must be a class."
+                    )
+
+            define(env, None)
+
+            method_env = env
+            if superclass is not None:
+                method_env = Environment(env, 1)
+                method_env.values[0] = superclass
+
+            define(
+                env,
+                LoxClass(
+                    name,
+                    superclass,
+                    {method_name: make(method_env) for method_name, make in methods},
+                ),
+            )
+
+        return class_
+
+    def visit_expression(self, stmt):
+        expression = self.compile(stmt.expression)
+
+        def expression_statement(env):
+            expression(env)
+
+        return expression_statement
+
+    def visit_function(self, stmt):
+        define = self.compile_define(stmt)
+        make = self.compile_function(stmt, False)
+        if stmt.pure and self.memoizer is not None:
+            wrap = self.memoizer.wrap
+            return lambda env: define(env, wrap(make(env)))
+        return lambda env: define(env, make(env))
+
+    def visit_if(self, stmt):
+        condition = self.compile(stmt.condition)
+        then_branch = self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            def if_(env):
+                value = condition(env)
+                if value is not None and value is not False:
+                    return then_branch(env)
+
+            return if_
+
+        else_branch = self.compile(stmt.else_branch)
+
+        def if_else(env):
+            value = condition(env)
+            if value is not None and value is not False:
+                return then_branch(env)
+            return else_branch(env)
+
+        return if_else
+
+    def visit_print(self, stmt):
+        expression = self.compile(stmt.expression)
+
+        def print_(env):
+            self.output.print(stringify(expression(env)))
+
+        return print_
+
+    def visit_return(self, stmt):
+        if stmt.value is None:
+            return lambda env: (None,)
+        value = self.compile(stmt.value)
+        return lambda env: (value(env),)
+
+    def visit_var(self, stmt):
+        define = self.compile_define(stmt)
+        if stmt.initializer is None:
+            return lambda env: define(env, None)
+
+        initializer = self.compile(stmt.initializer)
+        slot = stmt.slot
+        if slot is None:
+            return lambda env: define(env, initializer(env))
+
+        def var(env):
+            env.values[slot] = initializer(env)
+
+        return var
+
+    def visit_while(self, stmt):
+        condition = self.compile(stmt.condition)
+        body = self.compile(stmt.body)
+
+        def while_(env):
+            while True:
+                value = condition(env)
+                if value is None or value is False:
+                    return
+                result = body(env)
+                if result is not None:
+                    return result
+
+        return while_
+
+    def visit_assign(self, expr):
+        value = self.compile(expr.value)
+        name = expr.name
+        distance = expr.depth
+        slot = expr.slot
+        if distance is None:
+            assign = self.globals.assign
+
+            def assign_global(env):
+                result = value(env)
+                assign(name, result)
+                return result
+
+            return assign_global
+        if distance == 0:
+            def assign_local(env):
+                result = env.values[slot] = value(env)
+                return result
+
+            return assign_local
+
+        def assign_at(env):
+            result = env.ancestor(distance).values[slot] = value(env)
+            return result
+
+        return assign_at
+
+    def visit_binary(self, expr):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        operator = expr.operator
+        op_type = operator.type
+
+        if op_type is TokenType.PLUS:
+            def add(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a + b
+                return Interpreter.add(operator, a, b)
+
+            return add
+        if op_type is TokenType.MINUS:
+            def subtract(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a - b
+                check_number_operands(operator, a, b)
+                return float(a) - float(b)
+
+            return subtract
+        if op_type is TokenType.SLASH:
+            def divide(env):
+                a = left(env)
+                b = right(env)
+                check_number_operands(operator, a, b)
+                if b == 0:
+                    raise RuntimeException(operator, "Division by zero")
+                return float(a) / float(b)
+
+            return divide
+        if op_type is TokenType.STAR:
+            def multiply(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a * b
+                check_number_operands(operator, a, b)
+                return float(a) * float(b)
+
+            return multiply
+        if op_type is TokenType.GREATER:
+            def greater(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a > b
+                check_number_operands(operator, a, b)
+                return float(a) > float(b)
+
+            return greater
+        if op_type is TokenType.GREATER_EQUAL:
+            def greater_equal(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a >= b
+                check_number_operands(operator, a, b)
+                return float(a) >= float(b)
+
+            return greater_equal
+        if op_type is TokenType.LESS:
+            def less(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a < b
+                check_number_operands(operator, a, b)
+                return float(a) < float(b)
+
+            return less
+        if op_type is TokenType.LESS_EQUAL:
+            def less_equal(env):
+                a = left(env)
+                b = right(env)
+                if type(a) is float and type(b) is float:
+                    return a <= b
+                check_number_operands(operator, a, b)
+                return float(a) <= float(b)
+
+            return less_equal
+        if op_type is TokenType.EQUAL_EQUAL:
+            return lambda env: left(env) == right(env)
+        if op_type is TokenType.BANG_EQUAL:
+            return lambda env: left(env) != right(env)
+
+    def visit_call(self, call):
+        callee = call.callee
+        arguments = [self.compile(argument) for argument in call.arguments]
+        paren = call.paren
+        count = len(arguments)
+
+        def call_value(function, args):
+            if type(function) is not CompiledFunction:
+                if type(function) is NativeFunction:
+                    if count == function.param_count:
+                        try:
+                            return function.call(self, args)
+                        except NativeError as exc:
+                            raise RuntimeException(paren, str(exc))
+                elif not isinstance(function, Callable):
+                    raise RuntimeException(
+                        paren, "Can only call functions and classes."
+                    )
+                if count != function.arity():
+                    raise RuntimeException(
+                        paren,
+                        f"Expected {function.arity()} arguments but got {count}.",
+                    )
+                return function.call(self, args)
+            if count != function.param_count:
+                raise RuntimeException(
+                    paren,
+                    f"Expected {function.param_count} arguments but got {count}.",
+                )
+            return function.call(self, args)
+
+        def call_method(method, obj, env):
+            args = [argument(env) for argument in arguments]
+            if count != method.param_count:
+                raise RuntimeException(
+                    paren,
+                    f"Expected {method.param_count} arguments but got {count}.",
+                )
+            return method.call_method(self, obj, args)
+
+        # Method calls go straight to the method without binding it first
+        if type(callee) is expr.Get:
+            obj_code = self.compile(callee.object)
+            name = callee.name
+            find_property = self.property_cache(name)
+
+            def invoke(env):
+                obj = obj_code(env)
+                if isinstance(obj, Instance):
+                    offset, method = find_property(obj)
+                    if offset is None:
+                        return call_method(method, obj, env)
+                    function = obj.values[offset]
+                else:
+                    function = array_method(name, obj)
+                return call_value(function, [argument(env) for argument in arguments])
+
+            return invoke
+        if type(callee) is expr.Super:
+            distance = callee.depth
+            find_method = self.method_cache(callee.method)
+
+            def super_invoke(env):
+                this_env = env.ancestor(distance - 1)
+                method = find_method(this_env.enclosing.values[0])
+                return call_method(method, this_env.values[0], env)
+
+            return super_invoke
+
+        callee_code = self.compile(callee)
+
+        def call_(env):
+            function = callee_code(env)
+            return call_value(function, [argument(env) for argument in arguments])
+
+        return call_
+
+    @staticmethod
+    def method_cache(name):
+        # A monomorphic inline cache: the call site remembers the last class
+        # it looked a method up on
+        key = name.lexeme
+        cached_class = cached_method = None
+
+        def find_method(class_):
+            nonlocal cached_class, cached_method
+            if class_ is not cached_class:
+                method = class_.find_method(key)
+                if method is None:
+                    raise RuntimeException(name, f"Undefined property '{key}'.")
+                cached_class, cached_method = class_, method
+            return cached_method
+
+        return find_method
+
+    @staticmethod
+    def property_cache(name):
+        # Gets cache on the instance's shape instead, which fixes both where a
+        # field is stored and, failing that, the method the name refers to
+        key = name.lexeme
+        cached_shape = cached_offset = cached_method = None
+
+        def find_property(obj):
+            nonlocal cached_shape, cached_offset, cached_method
+            shape = obj.shape
+            if shape is not cached_shape:
+                offset = shape.offsets.get(key)
+                method = None
+                if offset is None:
+                    method = obj.class_.find_method(key)
+                    if method is None:
+                        raise RuntimeException(name, f"Undefined property '{key}'.")
+                cached_shape, cached_offset, cached_method = shape, offset, method
+            return cached_offset, cached_method
+
+        return find_property
+
+    def visit_get(self, expr):
+        obj_code = self.compile(expr.object)
+        name = expr.name
+        find_property = self.property_cache(name)
+
+        def get(env):
+            obj = obj_code(env)
+            if isinstance(obj, Instance):
+                offset, method = find_property(obj)
+                if offset is None:
+                    return method.bind(obj)
+                return obj.values[offset]
+            return array_method(name, obj)
+
+        return get
+
+    def visit_grouping(self, expr):
+        return self.compile(expr.expression)
+
+    @staticmethod
+    def visit_literal(expr):
+        value = expr.value
+        return lambda env: value
+
+    def visit_logical(self, expr):
+        left = self.compile(expr.left)
+        right = self.compile(expr.right)
+        if expr.operator.type is TokenType.OR:
+            def or_(env):
+                value = left(env)
+                if value is not None and value is not False:
+                    return value
+                return right(env)
+
+            return or_
+
+        def and_(env):
+            value = left(env)
+            if value is None or value is False:
+                return value
+            return right(env)
+
+        return and_
+
+    def visit_set(self, expr):
+        obj_code = self.compile(expr.object)
+        value_code = self.compile(expr.value)
+        name = expr.name
+        key = name.lexeme
+        # Sets cache the offset of an existing field, or the shape that adding
+        # the field moves the instance to
+        cached_shape = cached_offset = next_shape = None
+
+        def set_(env):
+            nonlocal cached_shape, cached_offset, next_shape
+            obj = obj_code(env)
+            if not isinstance(obj, Instance):
+                raise RuntimeException(name, "Only instances have fields.")
+            value = value_code(env)
+            shape = obj.shape
+            if shape is not cached_shape:
+                cached_offset = shape.offsets.get(key)
+                next_shape = shape.add(key) if cached_offset is None else shape
+                cached_shape = shape
+            if cached_offset is None:
+                obj.values.append(value)
+                obj.shape = next_shape
+            else:
+                obj.values[cached_offset] = value
+            return value
+
+        return set_
+
+    def visit_super(self, expr):
+        distance = expr.depth
+        find_method = self.method_cache(expr.method)
+
+        def super_(env):
+            env = env.ancestor(distance - 1)
+            return find_method(env.enclosing.values[0]).bind(env.values[0])
+
+        return super_
+
+    def visit_this(self, expr):
+        return self.look_up_variable(expr.keyword, expr)
+
+    def visit_unary(self, expr):
+        right = self.compile(expr.right)
+        operator = expr.operator
+        if operator.type is TokenType.MINUS:
+            def negate(env):
+                value = right(env)
+                if type(value) is float:
+                    return -value
+                check_number_operands(operator, value)
+                return -float(value)
+
+            return negate
+
+        def not_(env):
+            value = right(env)
+            return value is None or value is False
+
+        return not_
+
+    def visit_variable(self, expr):
+        return self.look_up_variable(expr.name, expr)
+
+    def look_up_variable(self, name, expr):
+        distance = expr.depth
+        slot = expr.slot
+        if distance is None:
+            key = name.lexeme
+            values = self.globals.values
+            get = self.globals.get
+
+            def get_global(env):
+                try:
+                    return values[key]
+                except KeyError:
+                    return get(name)
+
+            return get_global
+        if distance == 0:
+            return lambda env: env.values[slot]
+        if distance == 1:
+            return lambda env: env.enclosing.values[slot]
+        if distance == 2:
+            return lambda env: env.enclosing.enclosing.values[slot]
+        return lambda env: env.ancestor(distance).values[slot]
@@ -0,0 +1,387 @@
+from . import expr
+from .chunk import OpCode
+from .object import VMFunction
+from .resolver import FunctionType
+from .tokens import TokenType
+
+
+UINT16_COUNT = 1 << 16
+
+
+BINARY_OPS = {
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.SLASH: OpCode.DIVIDE,
+    TokenType.STAR: OpCode.MULTIPLY,
+}
+
+
+class Local:
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.is_captured = False
+
+
+class Upvalue:
+    def __init__(self, index, is_local):
+        self.index = index
+        self.is_local = is_local
+
+
+class FunctionState:
+    def __init__(self, enclosing, type, name):
+        self.enclosing = enclosing
+        self.type = type
+        self.function = VMFunction(name)
+        self.upvalues = []
+        self.scope_depth = 0
+        if type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            self.locals = [Local("this", 0)]
+        else:
+            self.locals = [Local("", 0)]
+
+
+# Compiles a resolved program into bytecode for the VM. Scoping errors have
+# already been reported by the Resolver, so this only tracks where each
+# variable lives: a stack slot, an upvalue or a global.
+class Compiler:
+    def __init__(self, reporter):
+        self.reporter = reporter
+        self.current = None
+        self.line = 1
+
+    def compile(self, statements):
+        self.current = FunctionState(None, FunctionType.NONE, None)
+        for statement in statements:
+            statement.accept(self)
+        return self.end_function()
+
+    @property
+    def chunk(self):
+        return self.current.function.chunk
+
+    def emit(self, *units):
+        for unit in units:
+            self.chunk.write(unit, self.line)
+
+    def emit_jump(self, op):
+        self.emit(op, 0)
+        return len(self.chunk.code) - 1
+
+    def patch_jump(self, offset):
+        jump = len(self.chunk.code) - offset - 1
+        if jump >= UINT16_COUNT:
+            self.reporter.error(self.line, "Too much code to jump over.")
+        self.chunk.code[offset] = jump & 0xFFFF
+
+    def emit_loop(self, loop_start):
+        offset = len(self.chunk.code) - loop_start + 2
+        if offset >= UINT16_COUNT:
+            self.reporter.error(self.line, "Loop body too large.")
+        self.emit(OpCode.LOOP, offset & 0xFFFF)
+
+    def emit_return(self):
+        if self.current.type is FunctionType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+        self.emit(OpCode.RETURN)
+
+    def make_constant(self, value):
+        constant = self.chunk.add_constant(value)
+        if constant >= UINT16_COUNT:
+            self.reporter.error(self.line, "Too many constants in one chunk.")
+            return 0
+        return constant
+
+    def end_function(self):
+        self.emit_return()
+        function = self.current.function
+        function.upvalue_count = len(self.current.upvalues)
+        self.current = self.current.enclosing
+        return function
+
+    def begin_scope(self):
+        self.current.scope_depth += 1
+
+    def end_scope(self):
+        state = self.current
+        state.scope_depth -= 1
+        while state.locals and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+            state.locals.pop()
+
+    def add_local(self, name):
+        if len(self.current.locals) == UINT16_COUNT:
+            self.reporter.error(name.line, "Too many local variables in function.")
+            return
+        self.current.locals.append(Local(name.lexeme, -1))
+
+    def declare_variable(self, name):
+        if self.current.scope_depth > 0:
+            self.add_local(name)
+
+    def mark_initialized(self):
+        if self.current.scope_depth > 0:
+            self.current.locals[-1].depth = self.current.scope_depth
+
+    def define_variable(self, name):
+        if self.current.scope_depth > 0:
+            self.mark_initialized()
+        else:
+            self.emit(OpCode.DEFINE_GLOBAL, self.make_constant(name.lexeme))
+
+    @staticmethod
+    def resolve_local(state, name):
+        for i in range(len(state.locals) - 1, -1, -1):
+            local = state.locals[i]
+            if local.name == name and local.depth != -1:
+                return i
+        return -1
+
+    def add_upvalue(self, state, index, is_local):
+        for i, upvalue in enumerate(state.upvalues):
+            if upvalue.index == index and upvalue.is_local == is_local:
+                return i
+        state.upvalues.append(Upvalue(index, is_local))
+        return len(state.upvalues) - 1
+
+    def resolve_upvalue(self, state, name):
+        if state.enclosing is None:
+            return -1
+        local = self.resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(state, local, True)
+        upvalue = self.resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.add_upvalue(state, upvalue, False)
+        return -1
+
+    def named_variable(self, name, line, assign_value=None):
+        arg = self.resolve_local(self.current, name)
+        if arg != -1:
+            get_op, set_op = OpCode.GET_LOCAL, OpCode.SET_LOCAL
+        else:
+            arg = self.resolve_upvalue(self.current, name)
+            if arg != -1:
+                get_op, set_op = OpCode.GET_UPVALUE, OpCode.SET_UPVALUE
+            else:
+                self.line = line
+                arg = self.make_constant(name)
+                get_op, set_op = OpCode.GET_GLOBAL, OpCode.SET_GLOBAL
+
+        if assign_value is not None:
+            assign_value.accept(self)
+            self.line = line
+            self.emit(set_op, arg)
+        else:
+            self.line = line
+            self.emit(get_op, arg)
+
+    def function(self, stmt, type):
+        self.current = FunctionState(self.current, type, stmt.name.lexeme)
+        self.begin_scope()
+        self.current.function.arity = len(stmt.params)
+        for param in stmt.params:
+            self.add_local(param)
+            self.mark_initialized()
+        for statement in stmt.body:
+            statement.accept(self)
+
+        upvalues = self.current.upvalues
+        function = self.end_function()
+        self.line = stmt.name.line
+        self.emit(OpCode.CLOSURE, self.make_constant(function))
+        for upvalue in upvalues:
+            self.emit(1 if upvalue.is_local else 0, upvalue.index)
+
+    def visit_block(self, stmt):
+        self.begin_scope()
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.end_scope()
+
+    def visit_class(self, stmt):
+        self.line = stmt.name.line
+        name_constant = self.make_constant(stmt.name.lexeme)
+        self.declare_variable(stmt.name)
+        self.emit(OpCode.CLASS, name_constant)
+        self.define_variable(stmt.name)
+
+        if stmt.superclass is not None:
+            self.visit_variable(stmt.superclass)
+            self.begin_scope()
+            self.current.locals.append(Local("super", self.current.scope_depth))
+            self.named_variable(stmt.name.lexeme, stmt.name.line)
+            self.line = stmt.superclass.name.line
+            self.emit(OpCode.INHERIT)
+
+        self.named_variable(stmt.name.lexeme, stmt.name.line)
+        for method in stmt.methods:
+            if method.name.lexeme == "init":
+                type = FunctionType.INITIALIZER
+            else:
+                type = FunctionType.METHOD
+            self.function(method, type)
+            self.emit(OpCode.METHOD, self.make_constant(method.name.lexeme))
+        self.emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.end_scope()
+
+    def visit_expression(self, stmt):
+        stmt.expression.accept(self)
+        self.emit(OpCode.POP)
+
+    def visit_function(self, stmt):
+        self.declare_variable(stmt.name)
+        self.mark_initialized()
+        self.function(stmt, FunctionType.FUNCTION)
+        self.define_variable(stmt.name)
+
+    def visit_if(self, stmt):
+        stmt.condition.accept(self)
+        then_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is None:
+            self.patch_jump(then_jump)
+            return
+        else_jump = self.emit_jump(OpCode.JUMP)
+        self.patch_jump(then_jump)
+        stmt.else_branch.accept(self)
+        self.patch_jump(else_jump)
+
+    def visit_print(self, stmt):
+        stmt.expression.accept(self)
+        self.emit(OpCode.PRINT)
+
+    def visit_return(self, stmt):
+        self.line = stmt.keyword.line
+        if stmt.value is None:
+            self.emit_return()
+        else:
+            stmt.value.accept(self)
+            self.emit(OpCode.RETURN)
+
+    def visit_var(self, stmt):
+        self.declare_variable(stmt.name)
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        else:
+            self.emit(OpCode.NIL)
+        self.line = stmt.name.line
+        self.define_variable(stmt.name)
+
+    def visit_while(self, stmt):
+        loop_start = len(self.chunk.code)
+        stmt.condition.accept(self)
+        exit_jump = self.emit_jump(OpCode.POP_JUMP_IF_FALSE)
+        stmt.body.accept(self)
+        self.emit_loop(loop_start)
+        self.patch_jump(exit_jump)
+
+    def visit_assign(self, expr):
+        self.named_variable(expr.name.lexeme, expr.name.line, expr.value)
+
+    def visit_binary(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+        self.line = expr.operator.line
+        self.emit(BINARY_OPS[expr.operator.type])
+
+    def visit_call(self, call):
+        callee = call.callee
+        if isinstance(callee, expr.Get):
+            callee.object.accept(self)
+            for argument in call.arguments:
+                argument.accept(self)
+            self.line = call.paren.line
+            name = self.make_constant(callee.name.lexeme)
+            self.emit(OpCode.INVOKE, name, len(call.arguments))
+        elif isinstance(callee, expr.Super):
+            self.named_variable("this", callee.keyword.line)
+            for argument in call.arguments:
+                argument.accept(self)
+            self.named_variable("super", callee.keyword.line)
+            self.line = callee.method.line
+            self.emit(
+                OpCode.SUPER_INVOKE,
+                self.make_constant(callee.method.lexeme),
+                len(call.arguments),
+            )
+        else:
+            callee.accept(self)
+            for argument in call.arguments:
+                argument.accept(self)
+            self.line = call.paren.line
+            self.emit(OpCode.CALL, len(call.arguments))
+
+    def visit_get(self, expr):
+        expr.object.accept(self)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_PROPERTY, self.make_constant(expr.name.lexeme))
+
+    def visit_grouping(self, expr):
+        expr.expression.accept(self)
+
+    def visit_literal(self, expr):
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit(OpCode.CONSTANT, self.make_constant(expr.value))
+
+    def visit_logical(self, expr):
+        expr.left.accept(self)
+        if expr.operator.type is TokenType.OR:
+            else_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump = self.emit_jump(OpCode.JUMP)
+            self.patch_jump(else_jump)
+            self.emit(OpCode.POP)
+            expr.right.accept(self)
+            self.patch_jump(end_jump)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            self.emit(OpCode.POP)
+            expr.right.accept(self)
+            self.patch_jump(end_jump)
+
+    def visit_set(self, expr):
+        expr.object.accept(self)
+        expr.value.accept(self)
+        self.line = expr.name.line
+        self.emit(OpCode.SET_PROPERTY, self.make_constant(expr.name.lexeme))
+
+    def visit_super(self, expr):
+        self.named_variable("this", expr.keyword.line)
+        self.named_variable("super", expr.keyword.line)
+        self.line = expr.method.line
+        self.emit(OpCode.GET_SUPER, self.make_constant(expr.method.lexeme))
+
+    def visit_this(self, expr):
+        self.named_variable("this", expr.keyword.line)
+
+    def visit_unary(self, expr):
+        expr.right.accept(self)
+        self.line = expr.operator.line
+        if expr.operator.type is TokenType.MINUS:
+            self.emit(OpCode.NEGATE)
+        else:
+            self.emit(OpCode.NOT)
+
+    def visit_variable(self, expr):
+        self.named_variable(expr.name.lexeme, expr.name.line)
@@ -1,10 +1,12 @@
-from . import interpreter
+from .errors import RuntimeException
 
 
 class Environment:
-    def __init__(self, enclosing=None):
+    __slots__ = ("enclosing", "values")
+
+    def __init__(self, enclosing, size):
         self.enclosing = enclosing
-        self.values = {}
+        self.values = [None] * size
 
     def ancestor(self, distance):
         env = self
@@ -12,26 +14,29 @@ class Environment:
             env = env.enclosing
         return env
 
+    def get_at(self, distance, slot):
+        return self.ancestor(distance).values[slot]
+
+    def assign_at(self, distance, slot, value):
+        self.ancestor(distance).values[slot] = value
+
+
+class GlobalEnvironment:
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = {}
+
     def define(self, name, value):
         self.values[name] = value
 
     def get(self, name):
         if name.lexeme in self.values:
             return self.values[name.lexeme]
-        elif self.enclosing is not None:
-            return self.enclosing.get(name)
-        raise interpreter.RuntimeException(name, f"Undefined variable {name.lexeme}.")
-
-    def get_at(self, distance, name):
-        return self.ancestor(distance).values[name]
+        raise RuntimeException(name, f"Undefined variable {name.lexeme}.")
 
     def assign(self, name, value):
         if name.lexeme in self.values:
             self.values[name.lexeme] = value
-        elif self.enclosing is not None:
-            self.enclosing.assign(name, value)
         else:
-            raise interpreter.RuntimeException(name, f"Undefined variable {name.lexeme}.")
-
-    def assign_at(self, distance, name, value):
-        self.ancestor(distance).values[name.lexeme] = value
+            raise RuntimeException(name, f"Undefined variable {name.lexeme}.")
@@ -0,0 +1,59 @@
+from .tokens import TokenType
+
+
+class RuntimeException(RuntimeError):
+    def __init__(self, token, message):
+        super().__init__(message)
+        self.token = token
+
+
+class Error:
+    __slots__ = ("line", "message", "where", "runtime")
+
+    def __init__(self, line, message, where="", runtime=False):
+        self.line = line
+        self.message = message
+        self.where = where
+        self.runtime = runtime
+
+    def __repr__(self):
+        return f"Error({self.line!r}, {self.message!r}, {self.where!r}, {self.runtime})"
+
+    def __str__(self):
+        if self.runtime:
+            return f"{self.message}\n[line {self.line}]"
+        return f"[line {self.line}] Error{self.where}: {self.message}"
+
+
+# Collects the errors found while compiling and running one program. With
+# echo set each error is also printed as it is reported, as the command line
+# does.
+class ErrorReporter:
+    def __init__(self, echo=False):
+        self.echo = echo
+        self.errors = []
+
+    @property
+    def had_error(self):
+        return any(not error.runtime for error in self.errors)
+
+    @property
+    def had_runtime_error(self):
+        return any(error.runtime for error in self.errors)
+
+    def error(self, line, message):
+        self.report(Error(line, message))
+
+    def parse_error(self, token, message):
+        if token.type is TokenType.EOF:
+            self.report(Error(token.line, message, " at end"))
+        else:
+            self.report(Error(token.line, message, f" at '{token.lexeme}'"))
+
+    def runtime_error(self, exception):
+        self.report(Error(exception.token.line, str(exception), runtime=True))
+
+    def report(self, error):
+        if self.echo:
+            print(error)
+        self.errors.append(error)
@@ -1,17 +1,23 @@
 class Expr:
-    pass
+    __slots__ = ()
 
 
 class Assign(Expr):
+    __slots__ = fields = ("name", "value", "depth", "slot")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_assign(self)
 
 
 class Binary(Expr):
+    __slots__ = fields = ("left", "operator", "right")
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -22,25 +28,33 @@ class Binary(Expr):
 
 
 class Call(Expr):
+    __slots__ = fields = ("callee", "paren", "arguments", "cache")
+
     def __init__(self, callee, paren, arguments):
         self.callee = callee
         self.paren = paren
         self.arguments = arguments
+        self.cache = None
 
     def accept(self, visitor):
         return visitor.visit_call(self)
 
 
 class Get(Expr):
+    __slots__ = fields = ("object", "name", "cache")
+
     def __init__(self, object, name):
         self.object = object
         self.name = name
+        self.cache = None
 
     def accept(self, visitor):
         return visitor.visit_get(self)
 
 
 class Grouping(Expr):
+    __slots__ = fields = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
@@ -49,6 +63,8 @@ class Grouping(Expr):
 
 
 class Literal(Expr):
+    __slots__ = fields = ("value",)
+
     def __init__(self, value):
         self.value = value
 
@@ -57,6 +73,8 @@ class Literal(Expr):
 
 
 class Logical(Expr):
+    __slots__ = fields = ("left", "operator", "right")
+
     def __init__(self, left, operator, right):
         self.left = left
         self.operator = operator
@@ -67,33 +85,47 @@ class Logical(Expr):
 
 
 class Set(Expr):
+    __slots__ = fields = ("object", "name", "value", "cache")
+
     def __init__(self, object, name, value):
         self.object = object
         self.name = name
         self.value = value
+        self.cache = None
 
     def accept(self, visitor):
         return visitor.visit_set(self)
 
 
 class Super(Expr):
+    __slots__ = fields = ("keyword", "method", "depth", "slot", "cache")
+
     def __init__(self, keyword, method):
         self.keyword = keyword
         self.method = method
+        self.depth = None
+        self.slot = None
+        self.cache = None
 
     def accept(self, visitor):
         return visitor.visit_super(self)
 
 
 class This(Expr):
+    __slots__ = fields = ("keyword", "depth", "slot")
+
     def __init__(self, keyword):
         self.keyword = keyword
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_this(self)
 
 
 class Unary(Expr):
+    __slots__ = fields = ("operator", "right")
+
     def __init__(self, operator, right):
         self.operator = operator
         self.right = right
@@ -103,8 +135,12 @@ class Unary(Expr):
 
 
 class Variable(Expr):
+    __slots__ = fields = ("name", "depth", "slot")
+
     def __init__(self, name):
         self.name = name
+        self.depth = None
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_variable(self)
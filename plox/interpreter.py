@@ -1,37 +1,69 @@
 from numbers import Number
 
-from . import lox
-from .callable import Callable, Clock, Function, Return
-from .environment import Environment
+from . import expr
+from .expr import Binary, Call, Get
+from .arrays import LoxArray
+from .callable import Callable, Function, Return
+from .environment import Environment, GlobalEnvironment
+from .errors import RuntimeException
 from .lox_class import Instance, LoxClass
+from .natives import NATIVES, NativeError, NativeFunction
+from .output import Output
+from .quicken import (
+    GenericBinary,
+    GenericCall,
+    GenericGet,
+    copy_tree,
+    quicken_binary,
+    quicken_call,
+    quicken_get,
+    quicken_method_call,
+    unquicken,
+)
+from .rope import STRING_TYPES, concat
 from .tokens import TokenType
 
 
-class RuntimeException(RuntimeError):
-    def __init__(self, token, message):
-        super().__init__(message)
-        self.token = token
+class Interpreter:
+    function_type = Function
 
+    def __init__(self, output=None, memoizer=None):
+        self.output = Output() if output is None else output
+        self.memoizer = memoizer
+        self.environment = self.globals = GlobalEnvironment()
+        self.globals.values.update(NATIVES)
 
-class Interpreter:
-    def __init__(self):
-        self.environment = self.globals = Environment()
-        self.globals.define("clock", Clock())
-        self.locals = {}
+    def define_global(self, name, value):
+        self.globals.define(name, value)
+
+    # Engines run a program in two steps, so that what prepare makes of it can
+    # be run again, after a reset, without being made again. The tree-walker
+    # runs the statements themselves, but as quickening rewrites them, a tree
+    # that other engines may share is copied for it.
+    def interpret(self, statements, reporter):
+        self.run_prepared(statements, reporter)
 
-    def interpret(self, statements):
+    def prepare(self, statements, reporter):
+        return copy_tree(statements)
+
+    def reset(self, statements, output):
+        # Starts afresh for another run, as a new engine would
+        self.__init__(output, self.memoizer)
+        unquicken(statements)
+
+    def run_prepared(self, statements, reporter):
         try:
             for statement in statements:
                 self.execute(statement)
         except RuntimeException as exc:
-            lox.runtime_error(exc)
+            self.output.flush()
+            reporter.runtime_error(exc)
+        finally:
+            self.output.flush()
 
     def execute(self, stmt):
         stmt.accept(self)
 
-    def resolve(self, expr, depth):
-        self.locals[expr] = depth
-
     def execute_block(self, statements, environment):
         previous = self.environment
         try:
@@ -42,7 +74,14 @@ class Interpreter:
             self.environment = previous
 
     def visit_block(self, stmt):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        if stmt.size is None:
+            # A flattened block, whose variables are in the enclosing frame
+            for statement in stmt.statements:
+                self.execute(statement)
+        else:
+            self.execute_block(
+                stmt.statements, Environment(self.environment, stmt.size)
+            )
 
     def visit_class(self, stmt):
         superclass = None
@@ -53,14 +92,14 @@ class Interpreter:
                     stmt.superclass.name, "Superclass must be a class."
                 )
 
-        self.environment.define(stmt.name.lexeme, None)
+        self.define(stmt, None)
 
         if stmt.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+            self.environment = Environment(self.environment, 1)
+            self.environment.values[0] = superclass
 
         methods = {
-            method.name.lexeme: Function(
+            method.name.lexeme: self.function_type(
                 method, self.environment, method.name.lexeme == "init"
             )
             for method in stmt.methods
@@ -71,14 +110,16 @@ class Interpreter:
         if superclass is not None:
             self.environment = self.environment.enclosing
 
-        self.environment.assign(stmt.name, class_)
+        self.define(stmt, class_)
 
     def visit_expression(self, stmt):
         self.evaluate(stmt.expression)
 
     def visit_function(self, stmt):
-        function = Function(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        function = self.function_type(stmt, self.environment, False)
+        if stmt.pure and self.memoizer is not None:
+            function = self.memoizer.wrap(function)
+        self.define(stmt, function)
 
     def visit_if(self, stmt):
         if self.is_truthy(self.evaluate(stmt.condition)):
@@ -88,7 +129,7 @@ class Interpreter:
 
     def visit_print(self, stmt):
         value = self.evaluate(stmt.expression)
-        print(self.stringify(value))
+        self.output.print(self.stringify(value))
 
     def visit_return(self, stmt):
         value = None
@@ -100,83 +141,294 @@ class Interpreter:
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt, value)
 
     def visit_while(self, stmt):
         while self.is_truthy(self.evaluate(stmt.condition)):
             self.execute(stmt.body)
 
+    def define(self, stmt, value):
+        if stmt.slot is None:
+            self.globals.define(stmt.name.lexeme, value)
+        else:
+            self.environment.values[stmt.slot] = value
+
     def evaluate(self, expr):
         return expr.accept(self)
 
     def visit_assign(self, expr):
         value = self.evaluate(expr.value)
-        if expr in self.locals:
-            distance = self.locals[expr]
-            self.environment.assign_at(distance, expr.name, value)
-        else:
+        if expr.depth is None:
             self.globals.assign(expr.name, value)
+        else:
+            self.environment.assign_at(expr.depth, expr.slot, value)
         return value
 
     def visit_binary(self, expr):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
-        op_type = expr.operator.type
+        if type(expr) is Binary:
+            quicken_binary(expr, left, right)
+        return self.binary(expr.operator, left, right)
+
+    def binary(self, operator, left, right):
+        op_type = operator.type
         if op_type is TokenType.MINUS:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) - float(right)
         if op_type is TokenType.PLUS:
-            if isinstance(left, Number) and isinstance(right, Number):
-                return float(left) + float(right)
-            if isinstance(left, str) and isinstance(right, str):
-                return str(left) + str(right)
-            raise RuntimeException(
-                expr.operator, "Operands must be two numbers or two strings."
-            )
+            return self.add(operator, left, right)
         if op_type is TokenType.SLASH:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             if right == 0:
-                raise RuntimeException(
-                    expr.operator, "Division by zero"
-                )
+                raise RuntimeException(operator, "Division by zero")
             return float(left) / float(right)
         if op_type is TokenType.STAR:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) * float(right)
         if op_type is TokenType.GREATER:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) > float(right)
         if op_type is TokenType.GREATER_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) >= float(right)
         if op_type is TokenType.LESS:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) < float(right)
         if op_type is TokenType.LESS_EQUAL:
-            self.check_number_operands(expr.operator, left, right)
+            self.check_number_operands(operator, left, right)
             return float(left) <= float(right)
-        if op_type is TokenType.EQUAL:
+        if op_type is TokenType.EQUAL_EQUAL:
             return left == right
         if op_type is TokenType.BANG_EQUAL:
             return left != right
 
-    def visit_call(self, expr):
-        callee = self.evaluate(expr.callee)
-        arguments = [self.evaluate(argument) for argument in expr.arguments]
-        if not isinstance(callee, Callable):
-            raise RuntimeException(expr.paren, "Can only call functions and classes.")
-        if len(arguments) != callee.arity():
+    def deoptimize_binary(self, expr, left, right):
+        expr.__class__ = GenericBinary
+        return self.binary(expr.operator, left, right)
+
+    # Quickened binaries evaluate their operands with accept directly, which
+    # saves a call each
+
+    def visit_number_add(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left + right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_subtract(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left - right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_multiply(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left * right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_divide(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float and right:
+            return left / right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_greater(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left > right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_greater_equal(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left >= right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_less(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left < right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_number_less_equal(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if type(left) is float and type(right) is float:
+            return left <= right
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_string_add(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+            return concat(left, right)
+        return self.deoptimize_binary(expr, left, right)
+
+    def visit_equal(self, expr):
+        return expr.left.accept(self) == expr.right.accept(self)
+
+    def visit_not_equal(self, expr):
+        return expr.left.accept(self) != expr.right.accept(self)
+
+    def visit_call(self, call):
+        callee = call.callee
+        if type(callee) is expr.Get:
+            return self.invoke(call, self.evaluate(callee.object))
+        if type(callee) is expr.Super:
+            env = self.environment.ancestor(callee.depth - 1)
+            method = self.find_method(callee, env.enclosing.values[0], callee.method)
+            return self.call_method(call, method, env.values[0])
+        function = self.evaluate(callee)
+        if type(call) is Call:
+            quicken_call(call, function, len(call.arguments))
+        return self.call_function(call, function)
+
+    def invoke(self, call, obj):
+        # Method calls go straight to the method without binding it first
+        if isinstance(obj, Instance):
+            shape, offset, method = self.find_property(call.callee, obj)
+            if offset is None:
+                if type(call) is Call and len(call.arguments) == method.arity():
+                    quicken_method_call(call, shape, method)
+                return self.call_method(call, method, obj)
+            function = obj.values[offset]
+        else:
+            function = self.array_method(call.callee.name, obj)
+        if type(call) is Call:
+            call.__class__ = GenericCall
+        return self.call_function(call, function)
+
+    # A quickened node reads its cache once, and deoptimizes if the cache is
+    # gone as well as when the guard fails
+
+    def visit_stable_call(self, call):
+        function = call.callee.accept(self)
+        cache = call.cache
+        if cache is None or function is not cache:
+            call.__class__ = GenericCall
+            call.cache = None
+            return self.call_function(call, function)
+        arguments = [argument.accept(self) for argument in call.arguments]
+        return function.call(self, arguments)
+
+    def visit_method_call(self, call):
+        obj = call.callee.object.accept(self)
+        cache = call.cache
+        if cache is None or type(obj) is not Instance or obj.shape is not cache[0]:
+            call.__class__ = GenericCall
+            call.cache = None
+            return self.invoke(call, obj)
+        arguments = [argument.accept(self) for argument in call.arguments]
+        return cache[1].call_method(self, obj, arguments)
+
+    def call_function(self, call, function):
+        arguments = [self.evaluate(argument) for argument in call.arguments]
+        # Natives skip the checks below unless they are called wrongly
+        if type(function) is NativeFunction:
+            if len(arguments) == function.param_count:
+                try:
+                    return function.call(self, arguments)
+                except NativeError as exc:
+                    raise RuntimeException(call.paren, str(exc))
+        elif not isinstance(function, Callable):
+            raise RuntimeException(call.paren, "Can only call functions and classes.")
+        if len(arguments) != function.arity():
+            raise RuntimeException(
+                call.paren,
+                f"Expected {function.arity()} arguments but got {len(arguments)}.",
+            )
+        return function.call(self, arguments)
+
+    def call_method(self, call, method, obj):
+        arguments = [self.evaluate(argument) for argument in call.arguments]
+        if len(arguments) != method.arity():
             raise RuntimeException(
-                expr.paren,
-                f"Expected {callee.arity()} arguments but got {len(arguments)}.",
+                call.paren,
+                f"Expected {method.arity()} arguments but got {len(arguments)}.",
             )
-        return callee.call(self, arguments)
+        return method.call_method(self, obj, arguments)
+
+    @staticmethod
+    def find_method(node, class_, name):
+        # A monomorphic inline cache: each Get or Super remembers the last
+        # class it looked a method up on
+        cache = node.cache
+        if cache is not None and cache[0] is class_:
+            return cache[1]
+        method = class_.find_method(name.lexeme)
+        if method is None:
+            raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+        node.cache = (class_, method)
+        return method
+
+    @staticmethod
+    def find_property(node, obj):
+        # Gets cache on the instance's shape instead, which fixes both where a
+        # field is stored and, failing that, the method the name refers to
+        shape = obj.shape
+        cache = node.cache
+        if cache is None or cache[0] is not shape:
+            name = node.name
+            offset = shape.offsets.get(name.lexeme)
+            method = None
+            if offset is None:
+                method = obj.class_.find_method(name.lexeme)
+                if method is None:
+                    raise RuntimeException(
+                        name, f"Undefined property '{name.lexeme}'."
+                    )
+            cache = node.cache = (shape, offset, method)
+        return cache
 
     def visit_get(self, expr):
         obj = self.evaluate(expr.object)
+        value = self.get(expr, obj)
+        if type(expr) is Get:
+            quicken_get(expr, obj)
+        return value
+
+    def visit_field_get(self, expr):
+        obj = expr.object.accept(self)
+        cache = expr.cache
+        if cache is not None and type(obj) is Instance and obj.shape is cache[0]:
+            return obj.values[cache[1]]
+        expr.__class__ = GenericGet
+        return self.get(expr, obj)
+
+    def visit_method_get(self, expr):
+        obj = expr.object.accept(self)
+        cache = expr.cache
+        if cache is not None and type(obj) is Instance and obj.shape is cache[0]:
+            return cache[2].bind(obj)
+        expr.__class__ = GenericGet
+        return self.get(expr, obj)
+
+    def get(self, expr, obj):
         if isinstance(obj, Instance):
-            return obj.get(expr.name)
-        raise RuntimeException(expr.name, "Only instances have properties.")
+            _, offset, method = self.find_property(expr, obj)
+            if offset is None:
+                return method.bind(obj)
+            return obj.values[offset]
+        return self.array_method(expr.name, obj)
+
+    @staticmethod
+    def array_method(name, obj):
+        # Arrays are the only values other than instances with properties
+        if type(obj) is LoxArray:
+            method = obj.method(name.lexeme)
+            if method is None:
+                raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+            return method
+        raise RuntimeException(name, "Only instances have properties.")
 
     def visit_grouping(self, expr):
         return self.evaluate(expr.expression)
@@ -199,21 +451,28 @@ class Interpreter:
         if not isinstance(obj, Instance):
             raise RuntimeException(expr.name, "Only instances have fields.")
         value = self.evaluate(expr.value)
-        obj.set(expr.name, value)
+        # Sets cache the offset of an existing field, or the shape that adding
+        # the field moves the instance to
+        shape = obj.shape
+        cache = expr.cache
+        if cache is None or cache[0] is not shape:
+            offset = shape.offsets.get(expr.name.lexeme)
+            if offset is None:
+                cache = expr.cache = (shape, None, shape.add(expr.name.lexeme))
+            else:
+                cache = expr.cache = (shape, offset, shape)
+        _, offset, next_shape = cache
+        if offset is None:
+            obj.values.append(value)
+            obj.shape = next_shape
+        else:
+            obj.values[offset] = value
         return value
 
     def visit_super(self, expr):
-        distance = self.locals.get(expr)
-        superclass = self.environment.get_at(distance, "super")
-
-        obj = self.environment.get_at(distance - 1, "this")
-
-        method = superclass.find_method(expr.method.lexeme)
-        if method is None:
-            raise RuntimeException(
-                expr.method, f"Undefined property '{expr.method.lexeme}'."
-            )
-        return method.bind(obj)
+        env = self.environment.ancestor(expr.depth - 1)
+        method = self.find_method(expr, env.enclosing.values[0], expr.method)
+        return method.bind(env.values[0])
 
     def visit_this(self, expr):
         return self.look_up_variable(expr.keyword, expr)
@@ -231,10 +490,19 @@ class Interpreter:
         return self.look_up_variable(expr.name, expr)
 
     def look_up_variable(self, name, expr):
-        if expr in self.locals:
-            distance = self.locals[expr]
-            return self.environment.get_at(distance, name.lexeme)
-        return self.globals.get(name)
+        if expr.depth is None:
+            return self.globals.get(name)
+        return self.environment.get_at(expr.depth, expr.slot)
+
+    @staticmethod
+    def add(operator, left, right):
+        if isinstance(left, Number) and isinstance(right, Number):
+            return float(left) + float(right)
+        if isinstance(left, STRING_TYPES) and isinstance(right, STRING_TYPES):
+            return concat(left, right)
+        raise RuntimeException(
+            operator, "Operands must be two numbers or two strings."
+        )
 
     @staticmethod
     def check_number_operands(operator, *operands):
@@ -243,17 +511,17 @@ class Interpreter:
 
     @staticmethod
     def is_truthy(obj):
-        return obj not in (None, False)
+        return obj is not None and obj is not False
 
     @staticmethod
     def stringify(value):
         if value is None:
             return "nil"
+        if isinstance(value, bool):
+            return "true" if value else "false"
         if isinstance(value, Number):
             text = str(value)
             if text.endswith(".0"):
                 text = text[:-2]
             return text
-        if isinstance(value, bool):
-            return "true" if value else "false"
         return str(value)
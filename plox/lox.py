@@ -1,65 +1,149 @@
 import sys
 
+from . import cache
+from .closure_compiler import ClosureCompiler
+from .errors import ErrorReporter
+from .callable import Callable
 from .interpreter import Interpreter
+from .natives import NativeFunction, to_lox
+from .optimizer import Optimizer
+from .output import Output
 from .parser import Parser
 from .resolver import Resolver
 from .scanner import Scanner
-from .tokens import TokenType
-
-
-HAD_ERROR = False
-HAD_RUNTIME_ERROR = False
-
-
-def error(line, message):
-    report(line, "", message)
-
-
-def parse_error(token, message):
-    if token.type is TokenType.EOF:
-        report(token.line, " at end", message)
-    else:
-        report(token.line, f" at '{token.lexeme}'", message)
-
-
-def runtime_error(exception):
-    print(f"{exception}\n[line {exception.token.line}]")
-    global HAD_RUNTIME_ERROR
-    HAD_RUNTIME_ERROR = True
-
-
-def report(line, where, message):
-    print(f"[line {line}] Error{where}: {message}")
-    global HAD_ERROR
-    HAD_ERROR = True
-
-
-def run(source):
-    tokens = Scanner(source).scan_tokens()
-    statements = Parser(tokens).parse()
-
-    interpreter = Interpreter()
-    if not HAD_ERROR:
-        Resolver(interpreter).resolve(*statements)
-    if not HAD_ERROR:
-        interpreter.interpret(statements)
+from .segments import StacklessInterpreter
+from .tiers import TieredInterpreter
+from .transpiler import Transpiler
+from .vm import VM
+
+
+ENGINES = {
+    "closure": ClosureCompiler,
+    "python": Transpiler,
+    "stackless": StacklessInterpreter,
+    "tiered": TieredInterpreter,
+    "tree": Interpreter,
+    "vm": VM,
+}
+DEFAULT_ENGINE = "tree"
+# The engines that can memoize pure functions, given a Memoizer
+MEMO_ENGINES = ("closure", "stackless", "tiered", "tree")
+DEFAULT_OPTIMIZE = 1
+
+
+def resolve(source, reporter, optimize=DEFAULT_OPTIMIZE):
+    tokens = Scanner(source, reporter).scan_tokens()
+    statements = Parser(tokens, reporter).parse()
+    if not reporter.had_error:
+        resolver = Resolver(reporter)
+        resolver.resolve(*statements)
+        resolver.find_pure_functions()
+        resolver.flatten_scopes()
+    if optimize and not reporter.had_error:
+        statements = Optimizer().optimize(statements)
+    return statements
+
+
+# A program compiled once for embedding and run any number of times, each run
+# with its own globals. The engine prepares the program on the first run,
+# compiling it to closures, bytecode or Python, and later runs reuse both the
+# engine, reset in between, and what it prepared. The statements themselves are
+# never changed, so runs may overlap, each on an engine of its own. Nothing is
+# printed: run returns the errors that stopped the program, which are the
+# compile errors if there were any, and is empty when it ran to completion.
+# Printed output goes to stdout, which is either a file or an Output. Python
+# functions among the globals become natives.
+class Program:
+    def __init__(self, statements, errors, engine=DEFAULT_ENGINE):
+        self.statements = statements
+        self.errors = tuple(errors)
+        self.engine = engine
+        # Engines that have prepared the program and are free to run it again,
+        # with what each prepared
+        self.prepared = []
+
+    def run(self, globals=None, stdout=None):
+        if self.errors:
+            return list(self.errors)
+        reporter = ErrorReporter()
+        output = stdout if isinstance(stdout, Output) else Output(stdout)
+        try:
+            interpreter, code = self.prepared.pop()
+        except IndexError:
+            interpreter = ENGINES[self.engine](output)
+            code = interpreter.prepare(self.statements, reporter)
+            if reporter.had_error:
+                self.errors = tuple(reporter.errors)
+                return reporter.errors
+        else:
+            interpreter.reset(code, output)
+        for name, value in (globals or {}).items():
+            if callable(value) and not isinstance(value, Callable):
+                value = NativeFunction(name, value)
+            interpreter.define_global(name, to_lox(value))
+        interpreter.run_prepared(code, reporter)
+        self.prepared.append((interpreter, code))
+        return reporter.errors
+
+
+def compile(source, engine=DEFAULT_ENGINE, optimize=DEFAULT_OPTIMIZE):
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}")
+    reporter = ErrorReporter()
+    statements = resolve(source, reporter, optimize)
+    return Program(statements, reporter.errors, engine)
+
+
+def run(source, engine=DEFAULT_ENGINE, optimize=DEFAULT_OPTIMIZE):
+    reporter = ErrorReporter(echo=True)
+    statements = resolve(source, reporter, optimize)
+    if not reporter.had_error:
+        ENGINES[engine]().interpret(statements, reporter)
+    return reporter.errors
+
+
+def run_file(
+    path,
+    engine=DEFAULT_ENGINE,
+    use_cache=True,
+    optimize=DEFAULT_OPTIMIZE,
+    profile=None,
+    memoizer=None,
+):
+    with open(path) as f:
+        source = f.read()
+    reporter = ErrorReporter(echo=True)
+    statements = cache.load(path, source, optimize) if use_cache else None
+    if statements is None:
+        statements = resolve(source, reporter, optimize)
+        if use_cache and not reporter.had_error:
+            cache.store(path, source, optimize, statements)
+    if not reporter.had_error:
+        if profile is not None:
+            profile.run(statements, reporter)
+        elif memoizer is not None:
+            ENGINES[engine](memoizer=memoizer).interpret(statements, reporter)
+        else:
+            ENGINES[engine]().interpret(statements, reporter)
+    if reporter.had_error:
+        sys.exit(65)
+    if reporter.had_runtime_error:
+        sys.exit(70)
 
 
-def run_file(path):
+def emit_python(path, optimize=DEFAULT_OPTIMIZE):
+    reporter = ErrorReporter(echo=True)
     with open(path) as f:
-        run(f.read())
-    if HAD_ERROR:
+        statements = resolve(f.read(), reporter, optimize)
+    if reporter.had_error:
         sys.exit(65)
-    if HAD_RUNTIME_ERROR:
-        sys.exit(70)
+    print(Transpiler().source(statements))
 
 
-def run_prompt():
+def run_prompt(engine=DEFAULT_ENGINE, optimize=DEFAULT_OPTIMIZE):
     while True:
         try:
             line = input("> ")
         except EOFError:
             break
-        run(line)
-        global HAD_ERROR
-        HAD_ERROR = False
+        run(line, engine, optimize)
@@ -1,48 +1,80 @@
 from .callable import Callable
-from . import interpreter
+from .errors import RuntimeException
 
 
 class LoxClass(Callable):
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
+        # Inherited methods are copied down, so lookup never walks the chain
+        if superclass is not None:
+            methods = {**superclass.methods, **methods}
         self.methods = methods
+        # Every class roots its own tree of shapes, so a shape also fixes the
+        # class and with it the methods of an instance
+        self.shape = Shape()
 
     def __str__(self):
         return self.name
 
     def arity(self):
-        if initializer := self.find_method("init"):
+        if initializer := self.methods.get("init"):
             return initializer.arity()
         return 0
 
     def call(self, interpreter, arguments):
         instance = Instance(self)
-        if initializer := self.find_method("init"):
-            initializer.bind(instance).call(interpreter, arguments)
+        if initializer := self.methods.get("init"):
+            initializer.call_method(interpreter, instance, arguments)
         return instance
 
     def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
+        return self.methods.get(name)
+
+
+# A shape maps field names to offsets in an instance's values. Instances that
+# gain the same fields in the same order end up sharing one shape.
+class Shape:
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets=None):
+        self.offsets = offsets or {}
+        self.transitions = {}
+
+    def add(self, name):
+        shape = self.transitions.get(name)
+        if shape is None:
+            offsets = {**self.offsets, name: len(self.offsets)}
+            shape = self.transitions[name] = Shape(offsets)
+        return shape
 
 
 class Instance:
+    __slots__ = ("class_", "shape", "values")
+
     def __init__(self, class_):
         self.class_ = class_
-        self.fields = {}
+        self.shape = class_.shape
+        self.values = []
 
     def __str__(self):
         return f"{self.class_.name} instance"
 
     def get(self, name):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        offset = self.shape.offsets.get(name.lexeme)
+        if offset is not None:
+            return self.values[offset]
         if method := self.class_.find_method(name.lexeme):
             return method.bind(self)
-        raise interpreter.RuntimeException(name, f"Undefined property '{name.lexeme}'.")
+        raise RuntimeException(name, f"Undefined property '{name.lexeme}'.")
 
     def set(self, name, value):
-        self.fields[name.lexeme] = value
+        self.set_field(name.lexeme, value)
+
+    def set_field(self, key, value):
+        offset = self.shape.offsets.get(key)
+        if offset is None:
+            self.shape = self.shape.add(key)
+            self.values.append(value)
+        else:
+            self.values[offset] = value
@@ -0,0 +1,94 @@
+import sys
+
+from .callable import Callable
+
+
+# The number of results kept for each function when no size is given
+MEMO_SIZE = 1024
+
+MISSING = object()
+
+
+def memo_key(arguments):
+    key = tuple(arguments)
+    # Python takes true for 1 and -0 for 0, which Lox tells apart, so keys
+    # holding values like those also hold their text
+    if True in key or False in key:
+        return key + tuple(map(repr, key))
+    return key
+
+
+class MemoStats:
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# A pure function together with an LRU cache of its results, keyed on its
+# arguments. Results are kept in the order they were last used, so when the
+# cache is full the first one is dropped. Calls that raise a runtime error
+# leave nothing behind.
+class Memoized(Callable):
+    def __init__(self, function, size, stats):
+        self.function = function
+        self.size = size
+        self.stats = stats
+        self.results = {}
+
+    def arity(self):
+        return self.function.arity()
+
+    def call(self, interpreter, arguments):
+        key = memo_key(arguments)
+        results = self.results
+        result = results.pop(key, MISSING)
+        if result is not MISSING:
+            results[key] = result
+            self.stats.hits += 1
+            return result
+        self.stats.misses += 1
+        result = self.function.call(interpreter, arguments)
+        if len(results) >= self.size:
+            del results[next(iter(results))]
+            self.stats.evictions += 1
+        results[key] = result
+        return result
+
+    def __str__(self):
+        return str(self.function)
+
+
+# Memoizes the functions the Resolver found to be pure, for the engines that
+# take one. Each closure made from a declaration gets a cache of its own, as
+# the variables it captures may differ, but their statistics are added up.
+class Memoizer:
+    def __init__(self, size=MEMO_SIZE):
+        self.size = size
+        self.stats = {}
+
+    def wrap(self, function):
+        declaration = function.declaration
+        stats = self.stats.get(declaration)
+        if stats is None:
+            stats = self.stats[declaration] = MemoStats(
+                declaration.name.lexeme, declaration.name.line
+            )
+        return Memoized(function, self.size, stats)
+
+    def report(self, out=None):
+        out = sys.stderr if out is None else out
+        stats = sorted(
+            self.stats.values(), key=lambda stats: stats.hits, reverse=True
+        )
+        header = f"{'function':<32}{'hits':>10}{'misses':>10}{'evictions':>11}"
+        print(header, file=out)
+        for function in stats:
+            name = f"{function.name} [line {function.line}]"
+            print(
+                f"{name:<32}{function.hits:>10}{function.misses:>10}"
+                f"{function.evictions:>11}",
+                file=out,
+            )
@@ -0,0 +1,131 @@
+import importlib
+import importlib.util
+import inspect
+import os
+import time
+
+from .callable import Callable
+from .errors import RuntimeException
+from .rope import Rope, flatten
+
+
+POSITIONAL = (
+    inspect.Parameter.POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+)
+
+
+# Natives raise this to report a Lox runtime error with its message
+class NativeError(Exception):
+    pass
+
+
+def to_lox(value):
+    # Lox only has floating point numbers. Anything else a native returns is
+    # passed through as is: None, booleans and strings are Lox values already,
+    # and other objects are opaque to Lox, which can hold, compare and print
+    # them but do nothing more.
+    if type(value) is int:
+        return float(value)
+    return value
+
+
+# A Python callable exposed to Lox. Arguments are passed as the Lox values
+# they are, so numbers arrive as floats, except that ropes are joined into
+# strings. The result is converted with to_lox. Any exception raised by the
+# callable becomes a Lox runtime error at the call. Natives that call back
+# into Lox are also given the calling interpreter as the keyword argument
+# interpreter.
+class NativeFunction(Callable):
+    def __init__(self, name, function, arity=None, callback=False):
+        self.name = name
+        self.function = function
+        self.param_count = count_params(function) if arity is None else arity
+        self.callback = callback
+
+    def arity(self):
+        return self.param_count
+
+    def call(self, interpreter, arguments):
+        if Rope in map(type, arguments):
+            arguments = [flatten(argument) for argument in arguments]
+        try:
+            if self.callback:
+                result = self.function(*arguments, interpreter=interpreter)
+            else:
+                result = self.function(*arguments)
+        except (NativeError, RuntimeException):
+            # Raised on purpose, or by Lox code the native called back into
+            raise
+        except Exception as exc:
+            raise NativeError(f"Error in native {self.name}: {exc}") from exc
+        if type(result) is int:
+            return float(result)
+        return result
+
+    def __str__(self):
+        return "<native fn>"
+
+
+def count_params(function):
+    # The arity of a function is its number of required positional parameters.
+    # One taking *args or a required keyword has to be given its arity.
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except ValueError:
+        raise TypeError(f"Can't tell the arity of {function!r}")
+    count = 0
+    for parameter in parameters:
+        required = parameter.default is parameter.empty
+        if parameter.kind is parameter.VAR_POSITIONAL or (
+            parameter.kind is parameter.KEYWORD_ONLY and required
+        ):
+            raise TypeError(f"Can't tell the arity of {function!r}")
+        if parameter.kind in POSITIONAL and required:
+            count += 1
+    return count
+
+
+# The natives every engine starts with, as globals
+NATIVES = {}
+
+
+def register(name, function, arity=None):
+    native = NATIVES[name] = NativeFunction(name, function, arity)
+    return native
+
+
+def native(name=None, arity=None):
+    # A decorator registering a function under its own name by default. The
+    # function itself is returned unchanged.
+    def decorator(function):
+        register(function.__name__ if name is None else name, function, arity)
+        return function
+
+    return decorator
+
+
+# Plugins loaded in this process, which forked workers inherit
+PLUGINS = {}
+
+
+def load_plugin(plugin):
+    # A plugin is a module, named or given by its path, that registers natives
+    # when it is imported
+    module = PLUGINS.get(plugin)
+    if module is not None:
+        return module
+    if plugin.endswith(".py") or os.sep in plugin:
+        name = os.path.splitext(os.path.basename(plugin))[0]
+        spec = importlib.util.spec_from_file_location(name, plugin)
+        if spec is None:
+            raise ImportError(f"Can't load plugin {plugin}")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(plugin)
+    PLUGINS[plugin] = module
+    return module
+
+
+register("clock", time.time, 0)
@@ -0,0 +1,297 @@
+import operator
+import sys
+
+from . import expr
+from . import stmt
+from .tokens import TokenType
+
+
+# Operators folded when both operands are numbers. Division by zero is left
+# to the runtime, which reports it.
+NUMBER_OPS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.PLUS: operator.add,
+    TokenType.SLASH: operator.truediv,
+    TokenType.STAR: operator.mul,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+EQUALITY_OPS = {
+    TokenType.EQUAL_EQUAL: operator.eq,
+    TokenType.BANG_EQUAL: operator.ne,
+}
+
+
+def is_truthy(value):
+    return value is not None and value is not False
+
+
+def fold_binary(op_type, left, right):
+    # Returns the folded value in a tuple, or None when the operation has to
+    # happen at runtime, either because it fails there or because the engines
+    # do not agree on its result
+    if type(left) is float and type(right) is float:
+        if op_type in NUMBER_OPS and (op_type is not TokenType.SLASH or right):
+            return (NUMBER_OPS[op_type](left, right),)
+    if type(left) is str and type(right) is str and op_type is TokenType.PLUS:
+        return (sys.intern(left + right),)
+    if op_type in EQUALITY_OPS:
+        if type(left) is type(right) or left is None or right is None:
+            return (EQUALITY_OPS[op_type](left, right),)
+    return None
+
+
+class Binding:
+    def __init__(self, declaration=None):
+        self.declaration = declaration
+        self.reads = 0
+        self.writes = 0
+        # The value of a local that is never assigned after its declaration,
+        # wrapped in a tuple once it is known
+        self.constant = None
+
+
+# Rewrites a resolved program: folds and propagates constants and removes code
+# that can never run or whose result is never used. Nothing that can fail at
+# runtime is removed or moved, so errors and their lines are unchanged.
+class Optimizer:
+    def __init__(self):
+        self.scopes = []
+        self.bindings = {}
+        self.declarations = {}
+
+    def optimize(self, statements):
+        for statement in statements:
+            self.analyze(statement)
+        return self.statements(statements)
+
+    # The first pass links every local reference to the binding it resolved
+    # to and counts its reads and writes.
+    def analyze(self, node):
+        node_type = type(node)
+        if node_type is stmt.Block:
+            # Flattened blocks declare their variables in the enclosing scope
+            if node.size is not None:
+                self.scopes.append({})
+            for statement in node.statements:
+                self.analyze(statement)
+            if node.size is not None:
+                self.scopes.pop()
+        elif node_type is stmt.Function:
+            self.declare(node)
+            self.analyze_function(node)
+        elif node_type is stmt.Class:
+            self.declare(node)
+            if node.superclass is not None:
+                self.analyze(node.superclass)
+                self.scopes.append({0: Binding()})
+            self.scopes.append({0: Binding()})
+            for method in node.methods:
+                self.analyze_function(method)
+            self.scopes.pop()
+            if node.superclass is not None:
+                self.scopes.pop()
+        elif node_type is stmt.Var:
+            if node.initializer is not None:
+                self.analyze(node.initializer)
+            self.declare(node)
+        elif node_type in (expr.Variable, expr.This, expr.Super):
+            if binding := self.bind(node):
+                binding.reads += 1
+        elif node_type is expr.Assign:
+            self.analyze(node.value)
+            if binding := self.bind(node):
+                binding.writes += 1
+        else:
+            for field in node.fields:
+                value = getattr(node, field)
+                if isinstance(value, list):
+                    for item in value:
+                        self.analyze(item)
+                elif isinstance(value, (expr.Expr, stmt.Stmt)):
+                    self.analyze(value)
+
+    def analyze_function(self, function):
+        self.scopes.append({slot: Binding() for slot in range(len(function.params))})
+        for statement in function.body:
+            self.analyze(statement)
+        self.scopes.pop()
+
+    def declare(self, declaration):
+        if declaration.slot is not None:
+            binding = self.scopes[-1][declaration.slot] = Binding(declaration)
+            self.declarations[declaration] = binding
+
+    def bind(self, node):
+        if node.depth is not None:
+            binding = self.scopes[-1 - node.depth][node.slot]
+            self.bindings[node] = binding
+            return binding
+
+    # The second pass rewrites the tree. Statements return their replacement,
+    # or None when they can be dropped.
+    def statements(self, statements):
+        result = []
+        for statement in statements:
+            statement = statement.accept(self)
+            if statement is not None:
+                result.append(statement)
+                if type(statement) is stmt.Return:
+                    break
+        # Declarations of locals that are never read, either to begin with or
+        # after propagating their value, only need their initializer run
+        for i, statement in enumerate(result):
+            binding = self.declarations.get(statement)
+            if binding is None or binding.reads or binding.writes:
+                continue
+            if type(statement) is stmt.Function:
+                result[i] = None
+            elif type(statement) is stmt.Var:
+                initializer = statement.initializer
+                if initializer is None or type(initializer) is expr.Literal:
+                    result[i] = None
+                else:
+                    result[i] = stmt.Expression(initializer)
+        return [statement for statement in result if statement is not None]
+
+    def branch(self, statement):
+        statement = statement.accept(self)
+        if statement is None:
+            statement = stmt.Block([])
+        return statement
+
+    def visit_block(self, stmt):
+        stmt.statements = self.statements(stmt.statements)
+        return stmt
+
+    def visit_class(self, stmt):
+        if stmt.superclass is not None:
+            stmt.superclass = stmt.superclass.accept(self)
+        for method in stmt.methods:
+            method.accept(self)
+        return stmt
+
+    def visit_expression(self, stmt):
+        stmt.expression = stmt.expression.accept(self)
+        if type(stmt.expression) is expr.Literal:
+            return None
+        return stmt
+
+    def visit_function(self, stmt):
+        stmt.body = self.statements(stmt.body)
+        return stmt
+
+    def visit_if(self, stmt):
+        stmt.condition = stmt.condition.accept(self)
+        if type(stmt.condition) is expr.Literal:
+            if is_truthy(stmt.condition.value):
+                return stmt.then_branch.accept(self)
+            if stmt.else_branch is not None:
+                return stmt.else_branch.accept(self)
+            return None
+        stmt.then_branch = self.branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self.branch(stmt.else_branch)
+        return stmt
+
+    def visit_print(self, stmt):
+        stmt.expression = stmt.expression.accept(self)
+        return stmt
+
+    def visit_return(self, stmt):
+        if stmt.value is not None:
+            stmt.value = stmt.value.accept(self)
+        return stmt
+
+    def visit_var(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = stmt.initializer.accept(self)
+        binding = self.declarations.get(stmt)
+        if binding is not None and not binding.writes:
+            if stmt.initializer is None:
+                binding.constant = (None,)
+            elif type(stmt.initializer) is expr.Literal:
+                binding.constant = (stmt.initializer.value,)
+        return stmt
+
+    def visit_while(self, stmt):
+        stmt.condition = stmt.condition.accept(self)
+        condition = stmt.condition
+        if type(condition) is expr.Literal and not is_truthy(condition.value):
+            return None
+        stmt.body = self.branch(stmt.body)
+        return stmt
+
+    def visit_assign(self, expr):
+        expr.value = expr.value.accept(self)
+        return expr
+
+    def visit_binary(self, node):
+        node.left = node.left.accept(self)
+        node.right = node.right.accept(self)
+        left, right = node.left, node.right
+        if type(left) is expr.Literal and type(right) is expr.Literal:
+            folded = fold_binary(node.operator.type, left.value, right.value)
+            if folded is not None:
+                return expr.Literal(folded[0])
+        return node
+
+    def visit_call(self, call):
+        call.callee = call.callee.accept(self)
+        call.arguments = [argument.accept(self) for argument in call.arguments]
+        return call
+
+    def visit_get(self, expr):
+        expr.object = expr.object.accept(self)
+        return expr
+
+    def visit_grouping(self, node):
+        node.expression = node.expression.accept(self)
+        if type(node.expression) is expr.Literal:
+            return node.expression
+        return node
+
+    @staticmethod
+    def visit_literal(expr):
+        return expr
+
+    def visit_logical(self, node):
+        node.left = node.left.accept(self)
+        node.right = node.right.accept(self)
+        if type(node.left) is expr.Literal:
+            if is_truthy(node.left.value) is (node.operator.type is TokenType.OR):
+                return node.left
+            return node.right
+        return node
+
+    def visit_set(self, expr):
+        expr.object = expr.object.accept(self)
+        expr.value = expr.value.accept(self)
+        return expr
+
+    @staticmethod
+    def visit_super(expr):
+        return expr
+
+    @staticmethod
+    def visit_this(expr):
+        return expr
+
+    def visit_unary(self, node):
+        node.right = node.right.accept(self)
+        if type(node.right) is expr.Literal:
+            value = node.right.value
+            if node.operator.type is TokenType.BANG:
+                return expr.Literal(not is_truthy(value))
+            if type(value) is float:
+                return expr.Literal(-value)
+        return node
+
+    def visit_variable(self, node):
+        binding = self.bindings.get(node)
+        if binding is not None and binding.constant is not None:
+            binding.reads -= 1
+            return expr.Literal(binding.constant[0])
+        return node
@@ -0,0 +1,48 @@
+import io
+import sys
+
+
+BUFFER_SIZE = 1 << 16
+
+
+# Where Lox print statements write to. Printed lines are kept until about
+# size characters have built up and then written out together, which costs far
+# less than a write per print. Output to a terminal is written line by line
+# instead, as Python's own stdout is. Engines flush their output when they
+# stop, before any error is reported.
+class Output:
+    def __init__(self, file=None, size=None):
+        self.file = sys.stdout if file is None else file
+        if size is None:
+            # Any object with a write method will do, with or without the
+            # rest of the file interface
+            isatty = getattr(self.file, "isatty", lambda: False)
+            size = 1 if isatty() else BUFFER_SIZE
+        self.size = size
+        self.lines = []
+        self.pending = 0
+
+    def print(self, text):
+        self.lines.append(text)
+        self.pending += len(text) + 1
+        if self.pending >= self.size:
+            self.flush()
+
+    def flush(self):
+        if self.lines:
+            self.lines.append("")
+            self.file.write("\n".join(self.lines))
+            self.lines = []
+            self.pending = 0
+        flush = getattr(self.file, "flush", None)
+        if flush is not None:
+            flush()
+
+
+class CapturedOutput(Output):
+    def __init__(self, size=BUFFER_SIZE):
+        super().__init__(io.StringIO(), size)
+
+    def getvalue(self):
+        self.flush()
+        return self.file.getvalue()
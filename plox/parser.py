@@ -1,16 +1,20 @@
 from . import expr
-from . import lox
 from . import stmt
 from .tokens import TokenType
 
 
+# Precedences, from the loosest binding to the tightest
+ASSIGNMENT, OR, AND, EQUALITY, COMPARISON, TERM, FACTOR, UNARY, CALL = range(1, 10)
+
+
 class ParseError(RuntimeError):
     pass
 
 
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, reporter):
         self.tokens = tokens
+        self.reporter = reporter
         self.current = 0
 
     def parse(self):
@@ -159,80 +163,46 @@ class Parser:
         return statements
 
     def expression(self):
-        return self.assignment()
-
-    def assignment(self):
-        expression = self.logical_or()
-        if self.match(TokenType.EQUAL):
-            equals = self.previous()
-            value = self.assignment()
-            if isinstance(expression, expr.Variable):
-                name = expression.name
-                return expr.Assign(name, value)
-            elif isinstance(expression, expr.Get):
-                return expr.Set(expression.object, expression.name, value)
-            self.error(equals, "Invalid assignment target.")
-        return expression
-
-    def logical_or(self):
-        return self.left_associative_series(
-            expr.Logical, self.logical_and, (TokenType.OR,)
-        )
-
-    def logical_and(self):
-        return self.left_associative_series(
-            expr.Logical, self.equality, (TokenType.AND,)
-        )
-
-    def equality(self):
-        return self.left_associative_series(
-            expr.Binary, self.comparison, (TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL)
-        )
-
-    def comparison(self):
-        return self.left_associative_series(
-            expr.Binary,
-            self.term,
-            (
-                TokenType.GREATER,
-                TokenType.GREATER_EQUAL,
-                TokenType.LESS,
-                TokenType.LESS_EQUAL,
-            ),
-        )
-
-    def term(self):
-        return self.left_associative_series(
-            expr.Binary, self.factor, (TokenType.MINUS, TokenType.PLUS)
-        )
-
-    def factor(self):
-        return self.left_associative_series(
-            expr.Binary, self.unary, (TokenType.SLASH, TokenType.STAR)
-        )
-
-    def unary(self):
-        if self.match(TokenType.BANG, TokenType.MINUS):
-            operator = self.previous()
-            right = self.unary()
-            return expr.Unary(operator, right)
-        return self.call()
-
-    def call(self):
-        expression = self.primary()
+        return self.parse_precedence(ASSIGNMENT)
+
+    # A Pratt parser: the token starting an expression picks a prefix rule,
+    # then infix rules binding at least as tightly as the precedence asked
+    # for extend it from the left. Rules all take the parser and the token
+    # they were chosen by, so they can be called straight from the tables.
+    def parse_precedence(self, precedence):
+        token = self.tokens[self.current]
+        prefix = PREFIX_RULES.get(token.type)
+        if prefix is None:
+            raise self.error(token, "Expect expression.")
+        self.current += 1
+        expression = prefix(self, token)
         while True:
-            if self.match(TokenType.LEFT_PAREN):
-                expression = self.finish_call(expression)
-            elif self.match(TokenType.DOT):
-                name = self.consume(
-                    TokenType.IDENTIFIER, "Expect property name after '.'."
-                )
-                expression = expr.Get(expression, name)
-            else:
+            token = self.tokens[self.current]
+            rule = INFIX_RULES.get(token.type)
+            if rule is None or rule[0] < precedence:
                 break
+            self.current += 1
+            expression = rule[1](self, expression, token, rule[0])
+        if precedence == ASSIGNMENT and token.type is TokenType.EQUAL:
+            return self.assignment(expression, self.advance())
         return expression
 
-    def finish_call(self, callee):
+    def assignment(self, target, equals):
+        value = self.parse_precedence(ASSIGNMENT)
+        if type(target) is expr.Variable:
+            return expr.Assign(target.name, value)
+        if type(target) is expr.Get:
+            return expr.Set(target.object, target.name, value)
+        self.error(equals, "Invalid assignment target.")
+        return target
+
+    def binary(self, left, operator, precedence):
+        return expr.Binary(left, operator, self.parse_precedence(precedence + 1))
+
+    def logical(self, left, operator, precedence):
+        return expr.Logical(left, operator, self.parse_precedence(precedence + 1))
+
+    def call(self, callee, paren, precedence):
         arguments = []
         if not self.check(TokenType.RIGHT_PAREN):
             arguments.append(self.expression())
@@ -243,43 +213,44 @@ class Parser:
         paren = self.consume(TokenType.RIGHT_PAREN, "Expect ')' after arguments.")
         return expr.Call(callee, paren, arguments)
 
-    def primary(self):
-        if self.match(TokenType.FALSE):
-            return expr.Literal(False)
-        if self.match(TokenType.TRUE):
-            return expr.Literal(True)
-        if self.match(TokenType.NIL):
-            return expr.Literal(None)
-        if self.match(TokenType.NUMBER, TokenType.STRING):
-            return expr.Literal(self.previous().literal)
-        if self.match(TokenType.SUPER):
-            keyword = self.previous()
-            self.consume(TokenType.DOT, "Expect '.' after 'super'.")
-            method = self.consume(
-                TokenType.IDENTIFIER, "Expect superclass method name."
-            )
-            return expr.Super(keyword, method)
-        if self.match(TokenType.THIS):
-            return expr.This(self.previous())
-        if self.match(TokenType.IDENTIFIER):
-            return expr.Variable(self.previous())
-        if self.match(TokenType.LEFT_PAREN):
-            expression = self.expression()
-            self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return expr.Grouping(expression)
-        raise self.error(self.peek(), "Expect expression.")
-
-    def left_associative_series(self, parent, unit, operator_types):
-        expression = unit()
-        while self.match(*operator_types):
-            operator = self.previous()
-            right = unit()
-            expression = parent(expression, operator, right)
-        return expression
+    def dot(self, object, dot, precedence):
+        name = self.consume(TokenType.IDENTIFIER, "Expect property name after '.'.")
+        return expr.Get(object, name)
+
+    def unary(self, operator):
+        return expr.Unary(operator, self.parse_precedence(UNARY))
+
+    def grouping(self, paren):
+        expression = self.expression()
+        self.consume(TokenType.RIGHT_PAREN, "Expect ')' after expression.")
+        return expr.Grouping(expression)
+
+    def literal(self, token):
+        return expr.Literal(token.literal)
+
+    def false(self, token):
+        return expr.Literal(False)
+
+    def true(self, token):
+        return expr.Literal(True)
+
+    def nil(self, token):
+        return expr.Literal(None)
+
+    def super(self, keyword):
+        self.consume(TokenType.DOT, "Expect '.' after 'super'.")
+        method = self.consume(TokenType.IDENTIFIER, "Expect superclass method name.")
+        return expr.Super(keyword, method)
+
+    def this(self, keyword):
+        return expr.This(keyword)
+
+    def variable(self, name):
+        return expr.Variable(name)
 
     def match(self, *types):
-        if any(map(self.check, types)):
-            self.advance()
+        if self.tokens[self.current].type in types:
+            self.current += 1
             return True
         return False
 
@@ -289,7 +260,7 @@ class Parser:
         raise self.error(self.peek(), message)
 
     def check(self, type):
-        return not self.is_at_end() and self.peek().type is type
+        return self.tokens[self.current].type is type
 
     def advance(self):
         if not self.is_at_end():
@@ -305,9 +276,8 @@ class Parser:
     def previous(self):
         return self.tokens[self.current - 1]
 
-    @staticmethod
-    def error(token, message):
-        lox.parse_error(token, message)
+    def error(self, token, message):
+        self.reporter.parse_error(token, message)
         return ParseError
 
     def synchronize(self):
@@ -327,3 +297,34 @@ class Parser:
             )
         ):
             self.advance()
+
+
+PREFIX_RULES = {
+    TokenType.BANG: Parser.unary,
+    TokenType.FALSE: Parser.false,
+    TokenType.IDENTIFIER: Parser.variable,
+    TokenType.LEFT_PAREN: Parser.grouping,
+    TokenType.MINUS: Parser.unary,
+    TokenType.NIL: Parser.nil,
+    TokenType.NUMBER: Parser.literal,
+    TokenType.STRING: Parser.literal,
+    TokenType.SUPER: Parser.super,
+    TokenType.THIS: Parser.this,
+    TokenType.TRUE: Parser.true,
+}
+INFIX_RULES = {
+    TokenType.AND: (AND, Parser.logical),
+    TokenType.BANG_EQUAL: (EQUALITY, Parser.binary),
+    TokenType.DOT: (CALL, Parser.dot),
+    TokenType.EQUAL_EQUAL: (EQUALITY, Parser.binary),
+    TokenType.GREATER: (COMPARISON, Parser.binary),
+    TokenType.GREATER_EQUAL: (COMPARISON, Parser.binary),
+    TokenType.LEFT_PAREN: (CALL, Parser.call),
+    TokenType.LESS: (COMPARISON, Parser.binary),
+    TokenType.LESS_EQUAL: (COMPARISON, Parser.binary),
+    TokenType.MINUS: (TERM, Parser.binary),
+    TokenType.OR: (OR, Parser.logical),
+    TokenType.PLUS: (TERM, Parser.binary),
+    TokenType.SLASH: (FACTOR, Parser.binary),
+    TokenType.STAR: (FACTOR, Parser.binary),
+}
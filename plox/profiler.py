@@ -0,0 +1,187 @@
+from collections import Counter
+import json
+import sys
+from time import perf_counter
+
+from . import stmt
+from .callable import Function
+from .interpreter import Interpreter
+from .tokens import Token
+
+
+class FunctionStats:
+    def __init__(self, name, line):
+        self.name = name
+        self.line = line
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        # Recursive calls only add to the inclusive time of the outermost one
+        self.active = 0
+
+
+class Profile:
+    def __init__(self, json_path=None):
+        self.json_path = json_path
+        self.names = {}
+        self.functions = {}
+        self.lines = Counter()
+        # One [stats, time spent in callees] pair per active call
+        self.stack = []
+
+    def run(self, statements, reporter):
+        self.names = function_names(statements)
+        ProfilingInterpreter(self).interpret(statements, reporter)
+        self.report()
+
+    def enter(self, declaration):
+        stats = self.functions.get(declaration)
+        if stats is None:
+            if declaration is None:
+                stats = FunctionStats("<script>", 0)
+            else:
+                name = self.names.get(declaration, declaration.name.lexeme)
+                stats = FunctionStats(name, declaration.name.line)
+            self.functions[declaration] = stats
+        stats.calls += 1
+        stats.active += 1
+        self.stack.append([stats, 0.0])
+        return perf_counter()
+
+    def leave(self, start):
+        elapsed = perf_counter() - start
+        stats, callees = self.stack.pop()
+        stats.exclusive += elapsed - callees
+        stats.active -= 1
+        if not stats.active:
+            stats.inclusive += elapsed
+        if self.stack:
+            self.stack[-1][1] += elapsed
+
+    def report(self):
+        functions = sorted(
+            self.functions.values(), key=lambda stats: stats.exclusive, reverse=True
+        )
+        lines = sorted(self.lines.items(), key=lambda item: (-item[1], item[0]))
+        if self.json_path is not None:
+            with open(self.json_path, "w") as f:
+                json.dump(
+                    {
+                        "functions": [
+                            {
+                                "name": stats.name,
+                                "line": stats.line,
+                                "calls": stats.calls,
+                                "inclusive": stats.inclusive,
+                                "exclusive": stats.exclusive,
+                            }
+                            for stats in functions
+                        ],
+                        "lines": {str(line): count for line, count in lines},
+                    },
+                    f,
+                    indent=2,
+                )
+            return
+        out = sys.stderr
+        header = f"{'function':<32}{'calls':>10}{'incl (s)':>12}{'excl (s)':>12}"
+        print(header, file=out)
+        for stats in functions:
+            name = f"{stats.name} [line {stats.line}]" if stats.line else stats.name
+            print(
+                f"{name:<32}{stats.calls:>10}"
+                f"{stats.inclusive:>12.4f}{stats.exclusive:>12.4f}",
+                file=out,
+            )
+        print(f"\n{'line':<8}{'statements run':>16}", file=out)
+        for line, count in lines[:20]:
+            print(f"{line:<8}{count:>16}", file=out)
+
+
+class ProfiledFunction(Function):
+    def run(self, interpreter, closure, arguments):
+        profile = interpreter.profile
+        start = profile.enter(self.declaration)
+        try:
+            return super().run(interpreter, closure, arguments)
+        finally:
+            profile.leave(start)
+
+
+def first_line(node):
+    for field in node.fields:
+        value = getattr(node, field)
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, Token):
+                return item.line
+            if hasattr(item, "fields") and (line := first_line(item)) is not None:
+                return line
+    return None
+
+
+# Yields every statement in the program in source order, except for blocks
+def walk(statements):
+    for statement in statements:
+        if type(statement) is stmt.Block:
+            yield from walk(statement.statements)
+            continue
+        yield statement
+        if type(statement) is stmt.Class:
+            for method in statement.methods:
+                yield from walk(method.body)
+        elif type(statement) is stmt.Function:
+            yield from walk(statement.body)
+        elif type(statement) is stmt.If:
+            yield from walk([statement.then_branch])
+            if statement.else_branch is not None:
+                yield from walk([statement.else_branch])
+        elif type(statement) is stmt.While:
+            yield from walk([statement.body])
+
+
+def statement_lines(statements):
+    # Statements without a token of their own, such as a print of a literal,
+    # are put on the line of the statement before them
+    lines = {}
+    line = 1
+    for statement in walk(statements):
+        line = first_line(statement) or line
+        lines[statement] = line
+    return lines
+
+
+def function_names(statements):
+    names = {}
+    for statement in walk(statements):
+        if type(statement) is stmt.Class:
+            for method in statement.methods:
+                names[method] = f"{statement.name.lexeme}.{method.name.lexeme}"
+        elif type(statement) is stmt.Function:
+            names[statement] = statement.name.lexeme
+    return names
+
+
+# Times every Lox function call and counts the statements run on each line.
+# The plain Interpreter is left untouched, so profiling costs nothing when it
+# is off.
+class ProfilingInterpreter(Interpreter):
+    function_type = ProfiledFunction
+
+    def __init__(self, profile):
+        super().__init__()
+        self.profile = profile
+        self.statement_lines = {}
+
+    def interpret(self, statements, reporter):
+        self.statement_lines = statement_lines(statements)
+        start = self.profile.enter(None)
+        try:
+            super().interpret(statements, reporter)
+        finally:
+            self.profile.leave(start)
+
+    def execute(self, stmt):
+        line = self.statement_lines.get(stmt)
+        if line is not None:
+            self.profile.lines[line] += 1
+        stmt.accept(self)
@@ -0,0 +1,251 @@
+from . import expr
+from . import stmt
+from .callable import Callable
+from .lox_class import Instance
+from .natives import NativeFunction
+from .rope import STRING_TYPES
+from .tokens import TokenType
+
+
+# Quickened nodes, for the tree-walker. The first time a node runs it looks at
+# the values it was given and, if it can, rewrites itself in place by changing
+# its class to one specialised for them: a Binary that added two numbers
+# becomes a NumberAdd, whose visitor method only checks they are numbers again
+# before adding them. When that guard fails the node turns into a generic
+# one, which works as the node first did but is never specialised again.
+# Quickened classes add no slots, as only classes with the same layout can be
+# swapped, and only the tree-walker sees them since a program is run by one
+# engine.
+
+
+class NumberAdd(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_add(self)
+
+
+class NumberSubtract(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_subtract(self)
+
+
+class NumberMultiply(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_multiply(self)
+
+
+class NumberDivide(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_divide(self)
+
+
+class NumberGreater(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_greater(self)
+
+
+class NumberGreaterEqual(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_greater_equal(self)
+
+
+class NumberLess(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_less(self)
+
+
+class NumberLessEqual(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_number_less_equal(self)
+
+
+class StringAdd(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_string_add(self)
+
+
+# Equality works on any two values, so these need no guard
+class Equal(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_equal(self)
+
+
+class NotEqual(expr.Binary):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_not_equal(self)
+
+
+class GenericBinary(expr.Binary):
+    __slots__ = ()
+
+
+NUMBER_BINARIES = {
+    TokenType.PLUS: NumberAdd,
+    TokenType.MINUS: NumberSubtract,
+    TokenType.STAR: NumberMultiply,
+    TokenType.SLASH: NumberDivide,
+    TokenType.GREATER: NumberGreater,
+    TokenType.GREATER_EQUAL: NumberGreaterEqual,
+    TokenType.LESS: NumberLess,
+    TokenType.LESS_EQUAL: NumberLessEqual,
+}
+
+
+def quicken_binary(node, left, right):
+    op_type = node.operator.type
+    if op_type is TokenType.EQUAL_EQUAL:
+        node.__class__ = Equal
+    elif op_type is TokenType.BANG_EQUAL:
+        node.__class__ = NotEqual
+    elif type(left) is float and type(right) is float:
+        node.__class__ = NUMBER_BINARIES[op_type]
+    elif (
+        op_type is TokenType.PLUS
+        and isinstance(left, STRING_TYPES)
+        and isinstance(right, STRING_TYPES)
+    ):
+        node.__class__ = StringAdd
+    else:
+        node.__class__ = GenericBinary
+
+
+# Gets of a field or a method of instances of one shape, which the node's
+# inline cache holds
+class FieldGet(expr.Get):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_field_get(self)
+
+
+class MethodGet(expr.Get):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_method_get(self)
+
+
+class GenericGet(expr.Get):
+    __slots__ = ()
+
+
+def quicken_get(node, obj):
+    if type(obj) is not Instance:
+        node.__class__ = GenericGet
+    elif node.cache[1] is None:
+        node.__class__ = MethodGet
+    else:
+        node.__class__ = FieldGet
+
+
+# Calls of the same function every time, which the node caches once its arity
+# has been checked
+class StableCall(expr.Call):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_stable_call(self)
+
+
+# Calls of a method on instances of one shape. The node caches the shape and
+# the method.
+class MethodCall(expr.Call):
+    __slots__ = ()
+
+    def accept(self, visitor):
+        return visitor.visit_method_call(self)
+
+
+class GenericCall(expr.Call):
+    __slots__ = ()
+
+
+def quicken_call(node, function, count):
+    # Natives are left generic, as they also need their errors converted
+    if (
+        type(function) is not NativeFunction
+        and isinstance(function, Callable)
+        and function.arity() == count
+    ):
+        node.cache = function
+        node.__class__ = StableCall
+    else:
+        node.__class__ = GenericCall
+
+
+def quicken_method_call(node, shape, method):
+    node.cache = (shape, method)
+    node.__class__ = MethodCall
+
+
+NODE_TYPES = (expr.Expr, stmt.Stmt)
+
+# The class each quickened class was quickened from
+UNQUICKENED = {
+    cls: base
+    for base in (expr.Binary, expr.Get, expr.Call)
+    for cls in base.__subclasses__()
+}
+
+
+def copy_tree(nodes):
+    # A copy of a tree, as parsed and with empty caches, for one interpreter
+    # to quicken. Tokens and literal values are shared with the original.
+    copies = []
+    for node in nodes:
+        cls = UNQUICKENED.get(type(node), type(node))
+        copy = cls.__new__(cls)
+        for field in node.fields:
+            value = getattr(node, field)
+            if field == "cache":
+                value = None
+            elif isinstance(value, list):
+                value = [
+                    copy_tree((item,))[0] if isinstance(item, NODE_TYPES) else item
+                    for item in value
+                ]
+            elif isinstance(value, NODE_TYPES):
+                value = copy_tree((value,))[0]
+            setattr(copy, field, value)
+        copies.append(copy)
+    return copies
+
+
+def unquicken(nodes):
+    # Turns nodes quickened by an earlier run back into the nodes they were
+    # parsed as, with empty caches, so that the next run specialises them for
+    # its own values rather than deoptimizing on the last run's. Only the
+    # interpreter the tree was copied for may do this.
+    for node in nodes:
+        base = UNQUICKENED.get(type(node))
+        if base is not None:
+            node.__class__ = base
+        for field in node.fields:
+            value = getattr(node, field)
+            if field == "cache":
+                node.cache = None
+            elif isinstance(value, list):
+                unquicken(item for item in value if isinstance(item, NODE_TYPES))
+            elif isinstance(value, NODE_TYPES):
+                unquicken((value,))
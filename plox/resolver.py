@@ -1,6 +1,7 @@
 from enum import Enum
 
-from . import lox
+from .expr import Variable
+from .stmt import Block
 
 
 FunctionType = Enum("FunctionType", ["NONE", "FUNCTION", "INITIALIZER", "METHOD"])
@@ -9,11 +10,74 @@ FunctionType = Enum("FunctionType", ["NONE", "FUNCTION", "INITIALIZER", "METHOD"
 ClassType = Enum("ClassType", ["NONE", "CLASS", "SUBCLASS"])
 
 
+# A variable as the purity analysis sees it. Locals are declared once, but a
+# global can be declared any number of times, or not at all when the host or
+# a native defines it.
+class Binding:
+    __slots__ = ("declarations", "assigned", "function")
+
+    def __init__(self, declarations=0):
+        self.declarations = declarations
+        self.assigned = False
+        # The function declared by a fun statement, if that is what it holds
+        self.function = None
+
+    def is_constant(self):
+        return self.declarations == 1 and not self.assigned
+
+
+# What the purity analysis learns from the body of a function: whether
+# anything in it has a side effect, and the variables from outside it that it
+# reads and calls, which are only known to be safe once the whole program has
+# been resolved.
+class FunctionInfo:
+    __slots__ = ("declaration", "scope", "impure", "reads", "calls")
+
+    def __init__(self, declaration, scope, impure):
+        self.declaration = declaration
+        self.scope = scope
+        self.impure = impure
+        self.reads = []
+        self.calls = []
+
+
+# A scope as the layout of frames sees it. A block scope none of whose
+# variables are captured by a closure needs no environment of its own: its
+# variables are given slots in the frame of the closest scope that keeps one,
+# its host, after the slots of the scopes between them.
+class Scope:
+    __slots__ = ("node", "parent", "info", "size", "captured", "host", "offset")
+
+    def __init__(self, node, parent, info):
+        self.node = node
+        self.parent = parent
+        # The function the scope belongs to, as its FunctionInfo
+        self.info = info
+        self.size = 0
+        self.captured = False
+        self.host = self
+        self.offset = 0
+
+
+# Besides reporting static errors, the Resolver annotates the tree for the
+# runtime: each local variable reference gets the (depth, slot) of its
+# declaration, each declaration its slot, and each scope its size. It also
+# marks the functions that are pure, whose results depend on nothing but their
+# arguments. Block scopes that nothing captures are flattened into the frame
+# around them, and flattened blocks are left with no size.
 class Resolver:
-    def __init__(self, interpreter):
-        self.interpreter = interpreter
+    def __init__(self, reporter):
+        self.reporter = reporter
         self.scopes = []
+        self.slots = []
+        self.bindings = []
+        self.layout = []
+        self.all_scopes = []
+        self.placed = []
+        self.globals = {}
+        self.functions = []
         self.current_function = FunctionType.NONE
+        self.current_info = None
         self.current_class = ClassType.NONE
 
     def resolve(self, *args):
@@ -22,30 +86,111 @@ class Resolver:
 
     def resolve_function(self, function, type):
         enclosing_function = self.current_function
+        enclosing_info = self.current_info
         self.current_function = type
+        # Only plain functions are memoized, so methods count as impure
+        self.current_info = FunctionInfo(
+            function, len(self.scopes), type is not FunctionType.FUNCTION
+        )
+        self.functions.append(self.current_info)
 
-        self.begin_scope()
+        self.begin_scope(function)
         for param in function.params:
+            self.declare(param)
             self.define(param)
         self.resolve(*function.body)
-        self.end_scope()
+        function.size = self.end_scope()
 
         self.current_function = enclosing_function
-
-    def begin_scope(self):
+        self.current_info = enclosing_info
+
+    def find_pure_functions(self):
+        # Called once the whole program is resolved. Functions start out pure
+        # unless their own body rules them out, or they read a variable from
+        # outside that changes. Then any calling something other than a pure
+        # function are ruled out, until no more are, which leaves functions
+        # that only call each other pure.
+        pure = {
+            info.declaration: info
+            for info in self.functions
+            if not info.impure
+            and all(
+                binding is not None and binding.is_constant() for binding in info.reads
+            )
+        }
+        changed = True
+        while changed:
+            changed = False
+            for declaration, info in list(pure.items()):
+                if any(
+                    binding is None or binding.function not in pure
+                    for binding in info.calls
+                ):
+                    del pure[declaration]
+                    changed = True
+        for declaration in pure:
+            declaration.pure = True
+
+    def flatten_scopes(self):
+        # Called once the whole program is resolved, when it is known which
+        # scopes are captured. Outer scopes come before the scopes inside
+        # them, so each flattened block is placed after its parent's slots.
+        # Sibling blocks never run at the same time and share the same slots.
+        for scope in self.all_scopes:
+            parent = scope.parent
+            if type(scope.node) is Block and parent is not None and not scope.captured:
+                host = scope.host = parent.host
+                scope.offset = parent.offset + parent.size
+                host.node.size = max(host.node.size, scope.offset + scope.size)
+                scope.node.size = None
+        for node, scope, target in self.placed:
+            node.slot += target.offset
+            if scope is not None:
+                # References count the environments between them and their
+                # variable, which flattened blocks no longer add to
+                depth = 0
+                scope = scope.host
+                while scope is not target.host:
+                    scope = scope.parent.host
+                    depth += 1
+                node.depth = depth
+
+    def begin_scope(self, node=None):
+        parent = self.layout[-1] if self.layout else None
+        scope = Scope(node, parent, self.current_info)
+        self.layout.append(scope)
+        self.all_scopes.append(scope)
         self.scopes.append({})
+        self.slots.append({})
+        self.bindings.append({})
 
     def end_scope(self):
         self.scopes.pop()
+        self.bindings.pop()
+        scope = self.layout.pop()
+        scope.size = len(self.slots.pop())
+        return scope.size
 
     def declare(self, name):
         if self.scopes:
             scope = self.scopes[-1]
             if name.lexeme in scope:
-                lox.parse_error(
+                self.reporter.parse_error(
                     name, "Already a variable with this name in this scope."
                 )
             scope[name.lexeme] = False
+            self.bindings[-1][name.lexeme] = Binding(1)
+            return self.slots[-1].setdefault(name.lexeme, len(self.slots[-1]))
+        self.find_binding(name, None).declarations += 1
+
+    def declare_slot(self, stmt):
+        stmt.slot = self.declare(stmt.name)
+        if stmt.slot is not None:
+            self.placed.append((stmt, None, self.layout[-1]))
+
+    def add_local(self, name):
+        self.scopes[-1][name] = True
+        self.slots[-1][name] = len(self.slots[-1])
 
     def define(self, name):
         if self.scopes:
@@ -53,24 +198,49 @@ class Resolver:
 
     def resolve_local(self, expr, name):
         for i in range(len(self.scopes)):
-            if name.lexeme in self.scopes[len(self.scopes) - 1 - i]:
-                self.interpreter.resolve(expr, i)
+            slots = self.slots[len(self.scopes) - 1 - i]
+            if name.lexeme in slots:
+                expr.depth = i
+                expr.slot = slots[name.lexeme]
+                target = self.layout[len(self.scopes) - 1 - i]
+                if target.info is not self.current_info:
+                    target.captured = True
+                self.placed.append((expr, self.layout[-1], target))
                 return
 
+    def find_binding(self, name, depth):
+        if depth is None:
+            binding = self.globals.get(name.lexeme)
+            if binding is None:
+                binding = self.globals[name.lexeme] = Binding()
+            return binding
+        return self.bindings[len(self.bindings) - 1 - depth].get(name.lexeme)
+
+    def is_local(self, depth):
+        # Whether a variable at this depth belongs to the current function
+        return depth is not None and len(self.scopes) - 1 - depth >= (
+            self.current_info.scope
+        )
+
+    def mark_impure(self):
+        if self.current_info is not None:
+            self.current_info.impure = True
+
     def visit_block(self, stmt):
-        self.begin_scope()
+        self.begin_scope(stmt)
         self.resolve(*stmt.statements)
-        self.end_scope()
+        stmt.size = self.end_scope()
 
     def visit_class(self, stmt):
+        self.mark_impure()
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
 
-        self.declare(stmt.name)
+        self.declare_slot(stmt)
         self.define(stmt.name)
         if stmt.superclass is not None:
             if stmt.name.lexeme == stmt.superclass.name.lexeme:
-                lox.parse_error(
+                self.reporter.parse_error(
                     stmt.superclass.name, "A class can't inherit from itself"
                 )
             self.current_class = ClassType.SUBCLASS
@@ -78,10 +248,10 @@ class Resolver:
 
         if stmt.superclass is not None:
             self.begin_scope()
-            self.scopes[-1]["super"] = True
+            self.add_local("super")
 
         self.begin_scope()
-        self.scopes[-1]["this"] = True
+        self.add_local("this")
 
         for method in stmt.methods:
             if method.name.lexeme == "init":
@@ -101,7 +271,10 @@ class Resolver:
         self.resolve(stmt.expression)
 
     def visit_function(self, stmt):
-        self.declare(stmt.name)
+        # Functions declared inside are not followed by the analysis
+        self.mark_impure()
+        self.declare_slot(stmt)
+        self.find_binding(stmt.name, 0 if self.scopes else None).function = stmt
         self.define(stmt.name)
         self.resolve_function(stmt, FunctionType.FUNCTION)
 
@@ -111,20 +284,21 @@ class Resolver:
             self.resolve(stmt.else_branch)
 
     def visit_print(self, stmt):
+        self.mark_impure()
         self.resolve(stmt.expression)
 
     def visit_return(self, stmt):
         if self.current_function is FunctionType.NONE:
-            lox.parse_error(stmt.keyword, "Can't return from top-level code.")
+            self.reporter.parse_error(stmt.keyword, "Can't return from top-level code.")
         if stmt.value is not None:
             if self.current_function is FunctionType.INITIALIZER:
-                lox.parse_error(
+                self.reporter.parse_error(
                     stmt.keyword, "Can't return a value from an initializer."
                 )
             self.resolve(stmt.value)
 
     def visit_var(self, stmt):
-        self.declare(stmt.name)
+        self.declare_slot(stmt)
         if stmt.initializer is not None:
             self.resolve(stmt.initializer)
         self.define(stmt.name)
@@ -135,14 +309,28 @@ class Resolver:
     def visit_assign(self, expr):
         self.resolve(expr.value)
         self.resolve_local(expr, expr.name)
+        binding = self.find_binding(expr.name, expr.depth)
+        if binding is not None:
+            binding.assigned = True
+        if self.current_info is not None and not self.is_local(expr.depth):
+            self.current_info.impure = True
 
     def visit_binary(self, expr):
         self.resolve(expr.left, expr.right)
 
     def visit_call(self, expr):
         self.resolve(expr.callee, *expr.arguments)
+        if self.current_info is not None:
+            callee = expr.callee
+            if type(callee) is Variable:
+                binding = self.find_binding(callee.name, callee.depth)
+                self.current_info.calls.append(binding)
+            else:
+                self.current_info.impure = True
 
     def visit_get(self, expr):
+        # Fields can change between calls, and methods can have side effects
+        self.mark_impure()
         self.resolve(expr.object)
 
     def visit_grouping(self, expr):
@@ -155,21 +343,28 @@ class Resolver:
         self.resolve(expr.left, expr.right)
 
     def visit_set(self, expr):
+        self.mark_impure()
         self.resolve(expr.value)
         self.resolve(expr.object)
 
     def visit_super(self, expr):
+        self.mark_impure()
         if self.current_class is ClassType.NONE:
-            lox.parse_error(expr.keyword, "Can't use 'super' outside of a class.")
+            self.reporter.parse_error(
+                expr.keyword, "Can't use 'super' outside of a class."
+            )
         elif self.current_class is not ClassType.SUBCLASS:
-            lox.parse_error(
+            self.reporter.parse_error(
                 expr.keyword, "Can't use 'super' in a class with no superclass."
             )
         self.resolve_local(expr, expr.keyword)
 
     def visit_this(self, expr):
-        if self.current_class is not ClassType.CLASS:
-            lox.parse_error(expr.keyword, "Can't use 'this' outside of a class.")
+        self.mark_impure()
+        if self.current_class is ClassType.NONE:
+            self.reporter.parse_error(
+                expr.keyword, "Can't use 'this' outside of a class."
+            )
         self.resolve_local(expr, expr.keyword)
 
     def visit_unary(self, expr):
@@ -177,7 +372,9 @@ class Resolver:
 
     def visit_variable(self, expr):
         if self.scopes and self.scopes[-1].get(expr.name.lexeme) is False:
-            lox.parse_error(
+            self.reporter.parse_error(
                 expr.name, "Can't read local variable in its own initializer."
             )
         self.resolve_local(expr, expr.name)
+        if self.current_info is not None and not self.is_local(expr.depth):
+            self.current_info.reads.append(self.find_binding(expr.name, expr.depth))
@@ -0,0 +1,70 @@
+# Below this length strings are joined straight away, which for short strings
+# costs less than keeping track of their pieces
+ROPE_MIN_LENGTH = 256
+
+
+# A long string built by concatenation. Joining two Python strings copies
+# both, so a loop that appends to a string takes time quadratic in its final
+# length. A rope keeps its pieces in a list instead and only joins them when
+# the string is observed: printed, compared, hashed or passed to a native.
+# Appending to a rope adds to the end of its list in place, and the new rope
+# shares the list, knowing how many of the pieces are its own. Appending to a
+# rope whose list has already grown past it joins it first.
+class Rope:
+    __slots__ = ("parts", "count", "length", "text")
+
+    def __init__(self, parts, length):
+        self.parts = parts
+        self.count = len(parts)
+        self.length = length
+        self.text = None
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        text = self.text
+        if text is None:
+            parts = self.parts
+            if len(parts) != self.count:
+                parts = parts[: self.count]
+            text = self.text = "".join(parts)
+            # Later appends to this rope start from the joined string
+            self.parts = [text]
+            self.count = 1
+        return text
+
+    def __eq__(self, other):
+        if type(other) is Rope or type(other) is str:
+            return self.length == len(other) and str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __repr__(self):
+        return f"Rope({str(self)!r})"
+
+
+STRING_TYPES = (str, Rope)
+
+
+def concat(left, right):
+    # Joins two strings, either of which may be a rope
+    length = len(left) + len(right)
+    if length < ROPE_MIN_LENGTH:
+        # Neither is a rope, as ropes are longer than this
+        return left + right
+    if type(right) is Rope:
+        right = str(right)
+    if type(left) is Rope:
+        parts = left.parts
+        if len(parts) != left.count:
+            parts = [str(left)]
+        parts.append(right)
+        return Rope(parts, length)
+    return Rope([left, right], length)
+
+
+def flatten(value):
+    return str(value) if type(value) is Rope else value
@@ -0,0 +1,98 @@
+from collections import Counter
+import signal
+
+from .callable import Function
+from .interpreter import Interpreter
+from .profiler import function_names, statement_lines
+
+
+RUN_CODE = Function.run.__code__
+EXECUTE_CODE = Interpreter.execute.__code__
+
+
+# A sampling profiler for the tree engine. Nothing is recorded on calls: on
+# every tick of a wall-clock timer the Lox stack is read back from the Python
+# stack, where each Function.run frame is a Lox call and the innermost
+# Interpreter.execute frame under it holds the statement being run. Samples
+# are written as folded stacks, one "frame;frame;... count" line per stack.
+# The CPU-time timer would suit better, but it only ticks as often as the
+# kernel's clock, often 250 Hz.
+class Sampler:
+    def __init__(self, path, rate=1000):
+        self.path = path
+        self.interval = 1 / rate
+        self.names = {}
+        self.lines = {}
+        self.stacks = Counter()
+        # The last sample's stack, with the frame of each of its calls
+        self.stack = ()
+        self.frames = []
+        self.index = {}
+
+    def run(self, statements, reporter):
+        self.names = function_names(statements)
+        self.lines = statement_lines(statements)
+        previous = signal.signal(signal.SIGALRM, self.sample)
+        signal.setitimer(signal.ITIMER_REAL, self.interval, self.interval)
+        try:
+            Interpreter().interpret(statements, reporter)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+            self.frames = []
+            self.index = {}
+            self.write()
+
+    def sample(self, signum, frame):
+        # Samples are kept as the raw (declaration, statement) pairs and only
+        # turned into names and lines when written out
+        stack = []
+        frames = []
+        statement = None
+        while frame is not None:
+            code = frame.f_code
+            if code is EXECUTE_CODE:
+                if statement is None:
+                    statement = frame.f_locals["stmt"]
+            elif code is RUN_CODE:
+                i = self.index.get(frame)
+                if i is not None:
+                    # A call still running since the last sample has the same
+                    # callers, so the rest of the stack can be copied over
+                    stack.append((self.stack[i][0], statement))
+                    stack.extend(self.stack[i + 1 :])
+                    frames.append(frame)
+                    frames.extend(self.frames[i + 1 :])
+                    break
+                stack.append((frame.f_locals["self"].declaration, statement))
+                frames.append(frame)
+                statement = None
+            frame = frame.f_back
+        else:
+            stack.append((None, statement))
+            frames.append(None)
+        self.stack = stack = tuple(stack)
+        self.frames = frames
+        self.index = dict(zip(frames, range(len(frames))))
+        self.stacks[stack] += 1
+
+    def label(self, declaration, statement):
+        # A statement without a line of its own, or a sample taken before the
+        # first statement ran, falls back to the line of the function
+        name = self.names.get(declaration, "<script>")
+        line = self.lines.get(statement)
+        if line is None and declaration is not None:
+            line = declaration.name.line
+        return name if line is None else f"{name}:{line}"
+
+    def write(self):
+        folded = Counter()
+        for stack, count in self.stacks.items():
+            frames = (
+                self.label(declaration, statement)
+                for declaration, statement in reversed(stack)
+            )
+            folded[";".join(frames)] += count
+        with open(self.path, "w") as f:
+            for stack, count in sorted(folded.items()):
+                f.write(f"{stack} {count}\n")
@@ -1,4 +1,6 @@
-from . import lox
+import re
+import sys
+
 from .tokens import Token, TokenType
 
 
@@ -22,9 +24,10 @@ keywords = {
 }
 
 
-class Scanner:
-    def __init__(self, source):
+class CharacterScanner:
+    def __init__(self, source, reporter):
         self.source = source
+        self.reporter = reporter
         self.tokens = []
         self.start = 0
         self.current = 0
@@ -90,7 +93,7 @@ class Scanner:
         elif c.isalpha() or c == "_":
             self.identifier()
         else:
-            lox.error(self.line, "Unexpected character")
+            self.reporter.error(self.line, "Unexpected character")
 
     def identifier(self):
         while self.peek().isalnum() or self.peek() == "_":
@@ -105,14 +108,14 @@ class Scanner:
             self.advance()
 
         if self.is_at_end():
-            lox.error(self.line, "Unterminated string")
+            self.reporter.error(self.line, "Unterminated string")
             return
 
         self.advance()  # The closing "
 
         # Trim the surrounding quotes
         value = self.source[self.start + 1 : self.current - 1]
-        self.add_token(TokenType.STRING, value)
+        self.add_token(TokenType.STRING, sys.intern(value))
 
     def number(self):
         while self.peek().isdigit():
@@ -150,6 +153,78 @@ class Scanner:
         return ret
 
     def add_token(self, type, literal=None):
-        self.tokens.append(
-            Token(type, self.source[self.start : self.current], literal, self.line)
-        )
+        lexeme = self.source[self.start : self.current]
+        if literal is None:
+            lexeme = sys.intern(lexeme)
+        self.tokens.append(Token(type, lexeme, literal, self.line))
+
+
+simple_tokens = {
+    **keywords,
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    ",": TokenType.COMMA,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "/": TokenType.SLASH,
+    "*": TokenType.STAR,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+}
+
+
+identifier_start = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz_")
+
+
+# Splits the source into lexemes, runs of newlines and comments in one pass,
+# skipping other whitespace. Any other single character is left over for the
+# character scanner to report or, if it is not ASCII, to classify.
+lexeme_pattern = re.compile(
+    r"[ \t\r]*"
+    r'([A-Za-z_]\w*|[0-9]\d*(?:\.\d+)?|\n+|//[^\n]*|"[^"]*"?|[!=<>]=?|[^ \t\r])'
+)
+
+
+class Scanner(CharacterScanner):
+    def scan_tokens(self):
+        tokens = self.tokens
+        line = self.line
+        for text in lexeme_pattern.findall(self.source):
+            token_type = simple_tokens.get(text)
+            if token_type is not None:
+                tokens.append(Token(token_type, sys.intern(text), None, line))
+                continue
+            c = text[0]
+            if c in identifier_start:
+                tokens.append(Token(TokenType.IDENTIFIER, sys.intern(text), None, line))
+            elif c == "\n":
+                line += len(text)
+            elif c in "0123456789":
+                tokens.append(Token(TokenType.NUMBER, text, float(text), line))
+            elif c == '"':
+                line += text.count("\n")
+                if len(text) == 1 or text[-1] != '"':
+                    self.reporter.error(line, "Unterminated string")
+                else:
+                    # Interned so that equal strings are usually the same
+                    # object, which == compares without looking at them
+                    value = sys.intern(text[1:-1])
+                    tokens.append(Token(TokenType.STRING, text, value, line))
+            elif text[:2] != "//":
+                # Rare enough that it is simpler to start again one character
+                # at a time than to resume from the middle of the source
+                self.tokens = []
+                return super().scan_tokens()
+        self.line = line
+        tokens.append(Token(TokenType.EOF, "", None, line))
+        return tokens
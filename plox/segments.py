@@ -0,0 +1,94 @@
+import threading
+
+from .callable import Function, Return
+from .environment import Environment
+from .interpreter import Interpreter, RuntimeException
+
+
+# Lox calls that run on one segment before the next call starts a new one.
+# Each call takes around fifteen Python frames, which keeps a segment well
+# inside the default recursion limit.
+SEGMENT_CALLS = 40
+# Segments a program may nest before recursion counts as runaway, which allows
+# calls tens of thousands deep
+MAX_SEGMENTS = 1000
+# Python-to-Python calls don't recurse in C, so a segment needs little stack
+SEGMENT_STACK_SIZE = 1 << 20
+
+
+def on_new_segment(function, *args):
+    result = exception = None
+
+    def target():
+        nonlocal result, exception
+        try:
+            result = function(*args)
+        except BaseException as exc:
+            exception = exc
+
+    size = threading.stack_size(SEGMENT_STACK_SIZE)
+    try:
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+    finally:
+        threading.stack_size(size)
+    thread.join()
+    if exception is not None:
+        raise exception
+    return result
+
+
+class SegmentedFunction(Function):
+    # The body of Function.run is inlined along with execute_block, which
+    # saves more per call than counting the depth costs
+    def run(self, interpreter, closure, arguments):
+        if interpreter.depth == SEGMENT_CALLS:
+            return self.run_on_new_segment(interpreter, closure, arguments)
+        interpreter.depth += 1
+        environment = Environment(closure, self.declaration.size)
+        environment.values[: len(arguments)] = arguments
+        previous = interpreter.environment
+        interpreter.environment = environment
+        try:
+            for statement in self.declaration.body:
+                interpreter.execute(statement)
+        except Return as ret:
+            if self.is_initializer:
+                return closure.values[0]
+            return ret.value
+        finally:
+            interpreter.environment = previous
+            interpreter.depth -= 1
+        if self.is_initializer:
+            return closure.values[0]
+
+    def run_on_new_segment(self, interpreter, closure, arguments):
+        if interpreter.segments == MAX_SEGMENTS:
+            raise RuntimeException(self.declaration.name, "Stack overflow.")
+        interpreter.depth = 0
+        interpreter.segments += 1
+        try:
+            return on_new_segment(self.run, interpreter, closure, arguments)
+        except RuntimeException:
+            raise
+        except (RuntimeError, MemoryError):
+            # Out of threads or memory for another segment
+            raise RuntimeException(self.declaration.name, "Stack overflow.")
+        finally:
+            interpreter.depth = SEGMENT_CALLS
+            interpreter.segments -= 1
+
+
+# Runs the tree-walker on a segmented stack. Calls nest Python frames as
+# usual, but every SEGMENT_CALLS calls deep the next call runs on a new
+# thread, which starts with a fresh recursion count and C stack while the
+# caller waits. Recursion is then bounded by MAX_SEGMENTS rather than by
+# Python's recursion limit, past which a call is a stack overflow as on the
+# other engines, and shallow code pays only for counting its calls.
+class StacklessInterpreter(Interpreter):
+    function_type = SegmentedFunction
+
+    def __init__(self, output=None, memoizer=None):
+        super().__init__(output, memoizer)
+        self.depth = 0
+        self.segments = 0
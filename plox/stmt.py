@@ -1,26 +1,34 @@
 class Stmt:
-    pass
+    __slots__ = ()
 
 
 class Block(Stmt):
+    __slots__ = fields = ("statements", "size")
+
     def __init__(self, statements):
         self.statements = statements
+        self.size = None
 
     def accept(self, visitor):
         return visitor.visit_block(self)
 
 
 class Class(Stmt):
+    __slots__ = fields = ("name", "superclass", "methods", "slot")
+
     def __init__(self, name, superclass, methods):
         self.name = name
         self.superclass = superclass
         self.methods = methods
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_class(self)
 
 
 class Expression(Stmt):
+    __slots__ = fields = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
@@ -29,16 +37,23 @@ class Expression(Stmt):
 
 
 class Function(Stmt):
+    __slots__ = fields = ("name", "params", "body", "slot", "size", "pure")
+
     def __init__(self, name, params, body):
         self.name = name
         self.params = params
         self.body = body
+        self.slot = None
+        self.size = None
+        self.pure = None
 
     def accept(self, visitor):
         return visitor.visit_function(self)
 
 
 class If(Stmt):
+    __slots__ = fields = ("condition", "then_branch", "else_branch")
+
     def __init__(self, condition, then_branch, else_branch):
         self.condition = condition
         self.then_branch = then_branch
@@ -49,6 +64,8 @@ class If(Stmt):
 
 
 class Print(Stmt):
+    __slots__ = fields = ("expression",)
+
     def __init__(self, expression):
         self.expression = expression
 
@@ -57,6 +74,8 @@ class Print(Stmt):
 
 
 class Return(Stmt):
+    __slots__ = fields = ("keyword", "value")
+
     def __init__(self, keyword, value):
         self.keyword = keyword
         self.value = value
@@ -66,15 +85,20 @@ class Return(Stmt):
 
 
 class Var(Stmt):
+    __slots__ = fields = ("name", "initializer", "slot")
+
     def __init__(self, name, initializer):
         self.name = name
         self.initializer = initializer
+        self.slot = None
 
     def accept(self, visitor):
         return visitor.visit_var(self)
 
 
 class While(Stmt):
+    __slots__ = fields = ("condition", "body")
+
     def __init__(self, condition, body):
         self.condition = condition
         self.body = body
@@ -0,0 +1,142 @@
+from .callable import Function, Return
+from .closure_compiler import ClosureCompiler
+from .environment import Environment
+from .errors import RuntimeException
+from .interpreter import Interpreter
+
+
+# A function is compiled once it has been called this many times, and a loop
+# once its body has run this many times
+HOT_CALLS = 100
+HOT_LOOPS = 1000
+
+
+# Compiles hot code of a TieredInterpreter to closures. They work on the same
+# environments and globals as the tree-walker, since the layout of both comes
+# from the Resolver, so compiled and walked code can call each other freely.
+# Compiled code passes the compiler as the interpreter when it calls a
+# function, so it hands functions that are still walked back to the
+# tree-walker.
+class TierCompiler(ClosureCompiler):
+    def __init__(self, interpreter, tiers):
+        super().__init__(interpreter.output, interpreter.memoizer)
+        self.globals = interpreter.globals
+        self.interpreter = interpreter
+        self.tiers = tiers
+
+    def execute_block(self, statements, environment):
+        self.interpreter.execute_block(statements, environment)
+
+    # Nodes the tree-walker has quickened compile as the nodes they were
+    visit_number_add = ClosureCompiler.visit_binary
+    visit_number_subtract = ClosureCompiler.visit_binary
+    visit_number_multiply = ClosureCompiler.visit_binary
+    visit_number_divide = ClosureCompiler.visit_binary
+    visit_number_greater = ClosureCompiler.visit_binary
+    visit_number_greater_equal = ClosureCompiler.visit_binary
+    visit_number_less = ClosureCompiler.visit_binary
+    visit_number_less_equal = ClosureCompiler.visit_binary
+    visit_string_add = ClosureCompiler.visit_binary
+    visit_equal = ClosureCompiler.visit_binary
+    visit_not_equal = ClosureCompiler.visit_binary
+    visit_field_get = ClosureCompiler.visit_get
+    visit_method_get = ClosureCompiler.visit_get
+    visit_stable_call = ClosureCompiler.visit_call
+    visit_method_call = ClosureCompiler.visit_call
+
+
+# Counts calls and loop iterations, and holds the compiled code of whatever
+# has become hot. Both are kept per declaration or loop, for all the closures
+# made from it.
+class Tiers:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.compiler = TierCompiler(interpreter, self)
+        self.calls = {}
+        self.bodies = {}
+        self.iterations = {}
+        self.loops = {}
+
+    def function_body(self, declaration):
+        # Counts a call, returning the compiled body once the function is hot
+        body = self.bodies.get(declaration)
+        if body is None:
+            calls = self.calls[declaration] = self.calls.get(declaration, 0) + 1
+            if calls >= HOT_CALLS:
+                body = self.compiler.compile_sequence(declaration.body)
+                self.bodies[declaration] = body
+        return body
+
+    def compile_loop(self, stmt):
+        loop = self.loops[stmt] = self.compiler.compile(stmt)
+        return loop
+
+
+class TieredFunction(Function):
+    def __init__(self, declaration, closure, is_initializer):
+        super().__init__(declaration, closure, is_initializer)
+        # Compiled code checks the arity of methods through this
+        self.param_count = len(declaration.params)
+
+    # Walked calls inline Function.run and execute_block, as a call that took
+    # more Python frames would overflow the stack at a smaller depth than on
+    # the tree-walker
+    def run(self, interpreter, closure, arguments):
+        tiers = interpreter.tiers
+        declaration = self.declaration
+        body = tiers.function_body(declaration)
+        environment = Environment(closure, declaration.size)
+        environment.values[: len(arguments)] = arguments
+        try:
+            if body is None:
+                walker = tiers.interpreter
+                previous = walker.environment
+                walker.environment = environment
+                try:
+                    for statement in declaration.body:
+                        walker.execute(statement)
+                finally:
+                    walker.environment = previous
+                result = None
+            else:
+                result = body(environment)
+        except Return as ret:
+            result = (ret.value,)
+        except RecursionError:
+            raise RuntimeException(declaration.name, "Stack overflow.")
+        if self.is_initializer:
+            return closure.values[0]
+        if result is not None:
+            return result[0]
+
+
+# Walks the tree for code that has not run much, which costs nothing to
+# prepare, and compiles functions and loops that turn out to be hot with the
+# closure compiler. A function is compiled on its next call once it is hot. A
+# loop is compiled in the middle of running, and carries on compiled from the
+# iteration it had reached, since all its state is in the environment.
+class TieredInterpreter(Interpreter):
+    function_type = TieredFunction
+
+    def __init__(self, output=None, memoizer=None):
+        super().__init__(output, memoizer)
+        self.tiers = Tiers(self)
+
+    def visit_while(self, stmt):
+        tiers = self.tiers
+        loop = tiers.loops.get(stmt)
+        if loop is None:
+            iterations = tiers.iterations.get(stmt, 0)
+            while self.is_truthy(self.evaluate(stmt.condition)):
+                self.execute(stmt.body)
+                iterations += 1
+                if iterations >= HOT_LOOPS:
+                    loop = tiers.compile_loop(stmt)
+                    break
+            else:
+                tiers.iterations[stmt] = iterations
+                return
+        # Compiled statements return a tuple holding the value of a return
+        result = loop(self.environment)
+        if result is not None:
+            raise Return(result[0])
@@ -0,0 +1,844 @@
+import ast
+from numbers import Number
+from types import FunctionType, MethodType
+
+from . import expr
+from . import stmt
+from .arrays import LoxArray
+from .interpreter import Interpreter, RuntimeException
+from .natives import NATIVES, NativeError
+from .output import Output
+from .callable import Callable
+from .tokens import TokenType
+from .vm import Location
+
+
+FILENAME = "<lox>"
+
+
+COMPARE_OPS = {
+    TokenType.GREATER: ast.Gt,
+    TokenType.GREATER_EQUAL: ast.GtE,
+    TokenType.LESS: ast.Lt,
+    TokenType.LESS_EQUAL: ast.LtE,
+}
+
+
+EQUALITY_OPS = (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL)
+
+
+ARITHMETIC_OPS = {
+    TokenType.MINUS: ast.Sub,
+    TokenType.SLASH: ast.Div,
+}
+
+
+class LoxError(Exception):
+    pass
+
+
+# Lox classes become Python classes with this metaclass. Methods and fields
+# share the "a_" attribute prefix so that fields shadow methods, and looking
+# one up on the class itself is refused as it would be in Lox.
+class LoxType(type):
+    def __getattribute__(cls, name):
+        if name.startswith("a_"):
+            raise AttributeError(name)
+        return type.__getattribute__(cls, name)
+
+
+class LoxObject(metaclass=LoxType):
+    lox_name = None
+
+    def __init__(self):
+        pass
+
+    def __str__(self):
+        return f"{type(self).lox_name} instance"
+
+
+class Native:
+    def __init__(self, function):
+        self.function = function
+        self.arity = function.arity()
+
+    def __call__(self, *arguments):
+        if len(arguments) != self.arity:
+            raise LoxError(
+                f"Expected {self.arity} arguments but got {len(arguments)}."
+            )
+        return self.function.call(None, list(arguments))
+
+    def __str__(self):
+        return str(self.function)
+
+
+def lox_name(function):
+    name = function.__code__.co_name
+    return "init" if name == "__init__" else name.partition("_")[2]
+
+
+def arity(callee):
+    if isinstance(callee, FunctionType):
+        return callee.__code__.co_argcount
+    if isinstance(callee, MethodType):
+        return callee.__func__.__code__.co_argcount - 1
+    if isinstance(callee, LoxType):
+        return callee.__init__.__code__.co_argcount - 1
+    if isinstance(callee, Native):
+        return callee.arity
+
+
+def stringify(value):
+    if isinstance(value, FunctionType):
+        return f"<fn {lox_name(value)}>"
+    if isinstance(value, MethodType):
+        if type(value.__self__) is LoxArray:
+            # As on the other engines, where array methods are natives
+            return "<native fn>"
+        return f"<fn {lox_name(value.__func__)}>"
+    if isinstance(value, LoxType):
+        return value.lox_name
+    return Interpreter.stringify(value)
+
+
+def check_numbers(left, right):
+    if isinstance(left, Number) and isinstance(right, Number):
+        return True
+    raise LoxError("Operand must be a number.")
+
+
+def instance(obj):
+    if isinstance(obj, LoxObject):
+        return obj
+    raise LoxError("Only instances have fields.")
+
+
+def set_attribute(obj, name, value):
+    setattr(obj, name, value)
+    return value
+
+
+def super_method(superclass, obj, name):
+    for class_ in superclass.__mro__:
+        if name in class_.__dict__:
+            return MethodType(class_.__dict__[name], obj)
+    raise LoxError(f"Undefined property '{name[2:]}'.")
+
+
+def check_superclass(superclass):
+    if isinstance(superclass, LoxType):
+        return superclass
+    raise LoxError("Superclass must be a class.")
+
+
+# Each Python function the transpiler emits: the module itself, a Lox function
+# or method, or a block wrapped so that its variables get fresh cells.
+class Unit:
+    def __init__(self, parent, kind):
+        self.parent = parent
+        self.kind = kind
+        self.stores = set()
+        self.has_return = False
+
+
+def children(node):
+    for value in (getattr(node, field) for field in node.fields):
+        if isinstance(value, (expr.Expr, stmt.Stmt)):
+            yield value
+        elif isinstance(value, list):
+            yield from (v for v in value if isinstance(v, (expr.Expr, stmt.Stmt)))
+
+
+def find_captured(node, scopes, function, captured):
+    if isinstance(node, (expr.Variable, expr.Assign)) and node.depth is not None:
+        owner, owner_function = scopes[-1 - node.depth]
+        if owner_function is not function:
+            captured.add((id(owner), node.slot))
+    if isinstance(node, stmt.Class):
+        if node.superclass is not None:
+            find_captured(node.superclass, scopes, function, captured)
+            scopes = scopes + [(node.superclass, function)]
+        scopes = scopes + [(node, function)]
+        for method in node.methods:
+            find_captured(method, scopes, function, captured)
+        return
+    if isinstance(node, stmt.Function):
+        function = node
+    if isinstance(node, stmt.Function) or (
+        isinstance(node, stmt.Block) and node.size is not None
+    ):
+        scopes = scopes + [(node, function)]
+    for child in children(node):
+        find_captured(child, scopes, function, captured)
+
+
+def is_bool(node):
+    if isinstance(node, expr.Grouping):
+        return is_bool(node.expression)
+    if isinstance(node, expr.Binary):
+        op_type = node.operator.type
+        return op_type in COMPARE_OPS or op_type in EQUALITY_OPS
+    if isinstance(node, expr.Unary):
+        return node.operator.type is TokenType.BANG
+    if isinstance(node, expr.Logical):
+        return is_bool(node.left) and is_bool(node.right)
+    return isinstance(node, expr.Literal) and isinstance(node.value, bool)
+
+
+# Translates a resolved program into a Python module. Lox globals live in the
+# module namespace, locals become Python locals and cells, and every
+# expression that can fail at runtime is tagged with a site number in its
+# column offset, from which a Python exception is turned back into the Lox
+# error and line it stands for.
+class Transpiler:
+    def __init__(self, output=None):
+        self.output = Output() if output is None else output
+        self.namespace = {
+            "_LoxObject": LoxObject,
+            "_print": self.output.print,
+            "_str": stringify,
+            "_check": check_numbers,
+            "_instance": instance,
+            "_setattr": set_attribute,
+            "_super": super_method,
+            "_superclass": check_superclass,
+            "_setglobal": self.set_global,
+        }
+        for name, native in NATIVES.items():
+            self.define_global(name, native)
+        self.sites = [None]
+        self.scopes = []
+        self.owners = {}
+        self.captured = set()
+        self.unit = None
+        self.loop_depth = 0
+        self.count = 0
+        self.line = 1
+
+    def define_global(self, name, value):
+        if isinstance(value, Callable):
+            value = Native(value)
+        self.namespace[f"g_{name}"] = value
+
+    def interpret(self, statements, reporter):
+        self.run_prepared(self.prepare(statements, reporter), reporter)
+
+    def prepare(self, statements, reporter):
+        return compile(self.transpile(statements), FILENAME, "exec")
+
+    def reset(self, code, output):
+        # The sites and lines of the code are kept, to translate its errors
+        sites, line = self.sites, self.line
+        self.__init__(output)
+        self.sites, self.line = sites, line
+
+    def run_prepared(self, code, reporter):
+        try:
+            exec(code, self.namespace)
+        except (
+            LoxError,
+            NativeError,
+            AttributeError,
+            NameError,
+            RecursionError,
+            TypeError,
+            ZeroDivisionError,
+        ) as exc:
+            self.output.flush()
+            reporter.runtime_error(self.translate_error(exc))
+        finally:
+            self.output.flush()
+
+    def source(self, statements):
+        return ast.unparse(self.transpile(statements))
+
+    def transpile(self, statements):
+        for statement in statements:
+            find_captured(statement, [], None, self.captured)
+        self.unit = Unit(None, "module")
+        body = self.translate_sequence(statements)
+        return ast.Module(body=body or [self.at(ast.Pass)], type_ignores=[])
+
+    def set_global(self, name, value):
+        if name not in self.namespace:
+            raise LoxError(f"Undefined variable {name[2:]}.")
+        self.namespace[name] = value
+        return value
+
+    def translate_error(self, exc):
+        frame, line, site = None, self.line, None
+        tb = exc.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == FILENAME:
+                frame = tb.tb_frame
+                position = list(frame.f_code.co_positions())[tb.tb_lasti // 2]
+                line, site = position[0], self.sites[position[2] or 0]
+            tb = tb.tb_next
+
+        if isinstance(exc, (LoxError, NativeError)):
+            message = str(exc)
+        elif isinstance(exc, RecursionError):
+            message = "Stack overflow."
+        elif site is None:
+            raise exc
+        else:
+            message = self.describe(exc, frame.f_locals, *site)
+        return RuntimeException(Location(line), message)
+
+    @staticmethod
+    def describe(exc, values, kind, *data):
+        if kind == "add":
+            return "Operands must be two numbers or two strings."
+        if kind == "arithmetic":
+            if isinstance(exc, ZeroDivisionError):
+                return "Division by zero"
+            return "Operand must be a number."
+        if kind == "global":
+            return f"Undefined variable {data[0]}."
+        if kind == "get":
+            temp, name = data
+            if isinstance(values[temp], (LoxObject, LoxArray)):
+                return f"Undefined property '{name}'."
+            return "Only instances have properties."
+
+        temp, count = data[:2]
+        callee = values[temp]
+        if kind == "invoke":
+            callee = getattr(callee, f"a_{data[2]}")
+        expected = arity(callee)
+        if expected is None:
+            return "Can only call functions and classes."
+        return f"Expected {expected} arguments but got {count}."
+
+    def site(self, kind, *data):
+        self.sites.append((kind, *data))
+        return len(self.sites) - 1
+
+    def at(self, cls, site=0, **fields):
+        return cls(
+            **fields,
+            lineno=self.line,
+            end_lineno=self.line,
+            col_offset=site,
+            end_col_offset=site,
+        )
+
+    def load(self, name, site=0):
+        return self.at(ast.Name, site, id=name, ctx=ast.Load())
+
+    def store(self, name):
+        if not name.startswith("_"):
+            self.unit.stores.add(name)
+        return self.at(ast.Name, id=name, ctx=ast.Store())
+
+    def temp(self):
+        self.count += 1
+        return f"_t{self.count}"
+
+    def walrus(self, name, value):
+        return self.at(ast.NamedExpr, target=self.store(name), value=value)
+
+    def call(self, function, *arguments, site=0):
+        return self.at(
+            ast.Call,
+            site,
+            func=self.load(function) if isinstance(function, str) else function,
+            args=list(arguments),
+            keywords=[],
+        )
+
+    def constant(self, value):
+        return self.at(ast.Constant, value=value)
+
+    def compare(self, left, op, right):
+        return self.at(ast.Compare, left=left, ops=[op()], comparators=[right])
+
+    def is_truthy(self, node, temp):
+        return self.at(
+            ast.BoolOp,
+            op=ast.And(),
+            values=[
+                self.compare(self.walrus(temp, node), ast.IsNot, self.constant(None)),
+                self.compare(self.load(temp), ast.IsNot, self.constant(False)),
+            ],
+        )
+
+    def is_falsey(self, node, temp):
+        return self.at(
+            ast.BoolOp,
+            op=ast.Or(),
+            values=[
+                self.compare(self.walrus(temp, node), ast.Is, self.constant(None)),
+                self.compare(self.load(temp), ast.Is, self.constant(False)),
+            ],
+        )
+
+    def condition(self, node):
+        if is_bool(node):
+            return self.translate(node)
+        return self.is_truthy(self.translate(node), self.temp())
+
+    def translate(self, node):
+        return node.accept(self)
+
+    def translate_sequence(self, statements):
+        return [line for statement in statements for line in self.translate(statement)]
+
+    def body(self, statements):
+        return self.translate_sequence(statements) or [self.at(ast.Pass)]
+
+    def declare(self, stmt):
+        if stmt.slot is None:
+            return f"g_{stmt.name.lexeme}"
+        return self.declare_local(stmt.name.lexeme, stmt.slot)
+
+    def declare_local(self, name, slot):
+        self.count += 1
+        py_name = f"l{self.count}_{name}"
+        self.scopes[-1][slot] = py_name
+        self.owners[py_name] = self.unit
+        return py_name
+
+    def look_up(self, depth, slot):
+        return self.scopes[-1 - depth][slot]
+
+    def function(self, name, params, body, kind, this=False):
+        unit = self.unit
+        loop_depth = self.loop_depth
+        self.unit = Unit(unit, kind)
+        self.loop_depth = 0
+
+        self.scopes.append({})
+        args = [self.declare_local(param.lexeme, i) for i, param in enumerate(params)]
+        if this:
+            args.insert(0, "this")
+        statements = self.translate_sequence(body)
+        self.scopes.pop()
+
+        definition = self.at(
+            ast.FunctionDef,
+            name=name,
+            args=self.arguments(args),
+            body=self.declarations(self.unit) + statements or [self.at(ast.Pass)],
+            decorator_list=[],
+            returns=None,
+        )
+        self.unit = unit
+        self.loop_depth = loop_depth
+        return definition
+
+    def arguments(self, names):
+        return ast.arguments(
+            posonlyargs=[],
+            args=[self.at(ast.arg, arg=name) for name in names],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        )
+
+    def declarations(self, unit):
+        global_names, nonlocal_names = [], []
+        for name in sorted(unit.stores):
+            owner = self.owners.get(name, unit)
+            if owner is not unit:
+                if owner.parent is None:
+                    global_names.append(name)
+                else:
+                    nonlocal_names.append(name)
+        declarations = []
+        if global_names:
+            declarations.append(self.at(ast.Global, names=global_names))
+        if nonlocal_names:
+            declarations.append(self.at(ast.Nonlocal, names=nonlocal_names))
+        return declarations
+
+    def return_(self, value):
+        kind = self.unit.kind
+        if kind == "initializer":
+            return self.at(ast.Return, value=None)
+        if kind == "block":
+            self.unit.has_return = True
+            value = self.at(ast.Tuple, elts=[value], ctx=ast.Load())
+        return self.at(ast.Return, value=value)
+
+    def visit_block(self, stmt):
+        if stmt.size is None:
+            # Flattened blocks declare their variables in the enclosing scope
+            return self.translate_sequence(stmt.statements)
+        self.scopes.append({})
+        captured = any((id(stmt), slot) in self.captured for slot in range(stmt.size))
+        if not (captured and self.loop_depth):
+            statements = self.translate_sequence(stmt.statements)
+            self.scopes.pop()
+            return statements
+
+        # Variables captured by closures in a loop body need a fresh cell on
+        # every iteration, so the block runs as a function of its own.
+        unit = self.unit
+        loop_depth = self.loop_depth
+        self.unit = Unit(unit, "block")
+        self.loop_depth = 0
+        self.count += 1
+        name = f"_block{self.count}"
+        statements = self.translate_sequence(stmt.statements)
+        self.scopes.pop()
+        definition = self.at(
+            ast.FunctionDef,
+            name=name,
+            args=self.arguments([]),
+            body=self.declarations(self.unit) + statements,
+            decorator_list=[],
+            returns=None,
+        )
+        has_return = self.unit.has_return
+        self.unit = unit
+        self.loop_depth = loop_depth
+
+        if not has_return:
+            return [definition, self.at(ast.Expr, value=self.call(name))]
+        temp = self.temp()
+        result = self.at(
+            ast.Subscript,
+            value=self.load(temp),
+            slice=self.constant(0),
+            ctx=ast.Load(),
+        )
+        return [
+            definition,
+            self.at(
+                ast.If,
+                test=self.compare(
+                    self.walrus(temp, self.call(name)), ast.IsNot, self.constant(None)
+                ),
+                body=[self.return_(result)],
+                orelse=[],
+            ),
+        ]
+
+    def visit_class(self, stmt):
+        self.line = stmt.name.line
+        name = self.declare(stmt)
+        statements = []
+        base = self.load("_LoxObject")
+        if stmt.superclass is not None:
+            superclass = self.translate(stmt.superclass)
+            self.line = stmt.superclass.name.line
+            self.count += 1
+            base = f"l{self.count}_super"
+            self.owners[base] = self.unit
+            statements.append(
+                self.at(
+                    ast.Assign,
+                    targets=[self.store(base)],
+                    value=self.call("_superclass", superclass),
+                )
+            )
+            self.scopes.append({0: base})
+            base = self.load(base)
+        self.scopes.append({0: "this"})
+
+        body = [
+            self.at(
+                ast.Assign,
+                targets=[self.at(ast.Name, id="lox_name", ctx=ast.Store())],
+                value=self.constant(stmt.name.lexeme),
+            )
+        ]
+        for method in stmt.methods:
+            self.line = method.name.line
+            if method.name.lexeme != "init":
+                body.append(
+                    self.function(
+                        f"a_{method.name.lexeme}",
+                        method.params,
+                        method.body,
+                        "function",
+                        this=True,
+                    )
+                )
+                continue
+
+            # Constructing an instance runs __init__, while calling init on an
+            # instance goes through a_init, which also returns the instance.
+            initializer = self.function(
+                "__init__", method.params, method.body, "initializer", this=True
+            )
+            params = [arg.arg for arg in initializer.args.args]
+            body.append(initializer)
+            body.append(
+                self.at(
+                    ast.FunctionDef,
+                    name="a_init",
+                    args=self.arguments(params),
+                    body=[
+                        self.at(
+                            ast.Expr,
+                            value=self.call(
+                                self.at(
+                                    ast.Attribute,
+                                    value=self.load("__class__"),
+                                    attr="__init__",
+                                    ctx=ast.Load(),
+                                ),
+                                *map(self.load, params),
+                            ),
+                        ),
+                        self.at(ast.Return, value=self.load("this")),
+                    ],
+                    decorator_list=[],
+                    returns=None,
+                )
+            )
+
+        self.scopes.pop()
+        if stmt.superclass is not None:
+            self.scopes.pop()
+        if stmt.slot is not None:
+            self.unit.stores.add(name)
+        statements.append(
+            self.at(
+                ast.ClassDef,
+                name=name,
+                bases=[base],
+                keywords=[],
+                body=body,
+                decorator_list=[],
+            )
+        )
+        return statements
+
+    def visit_expression(self, stmt):
+        expression = stmt.expression
+        if isinstance(expression, expr.Assign) and expression.depth is not None:
+            value = self.translate(expression.value)
+            target = self.store(self.look_up(expression.depth, expression.slot))
+            return [self.at(ast.Assign, targets=[target], value=value)]
+        if isinstance(expression, expr.Set):
+            obj = self.translate(expression.object)
+            statements = []
+            if not isinstance(expression.object, expr.This):
+                self.line = expression.name.line
+                temp = self.temp()
+                statements.append(
+                    self.at(
+                        ast.Assign,
+                        targets=[self.store(temp)],
+                        value=self.call("_instance", obj),
+                    )
+                )
+                obj = self.load(temp)
+            value = self.translate(expression.value)
+            target = self.at(
+                ast.Attribute,
+                value=obj,
+                attr=f"a_{expression.name.lexeme}",
+                ctx=ast.Store(),
+            )
+            statements.append(self.at(ast.Assign, targets=[target], value=value))
+            return statements
+        return [self.at(ast.Expr, value=self.translate(expression))]
+
+    def visit_function(self, stmt):
+        self.line = stmt.name.line
+        name = self.declare(stmt)
+        if stmt.slot is not None:
+            self.unit.stores.add(name)
+        return [self.function(name, stmt.params, stmt.body, "function")]
+
+    def visit_if(self, stmt):
+        condition = self.condition(stmt.condition)
+        then_branch = self.body([stmt.then_branch])
+        else_branch = []
+        if stmt.else_branch is not None:
+            else_branch = self.body([stmt.else_branch])
+        return [
+            self.at(ast.If, test=condition, body=then_branch, orelse=else_branch)
+        ]
+
+    def visit_print(self, stmt):
+        value = self.call("_print", self.call("_str", self.translate(stmt.expression)))
+        return [self.at(ast.Expr, value=value)]
+
+    def visit_return(self, stmt):
+        self.line = stmt.keyword.line
+        value = self.constant(None)
+        if stmt.value is not None:
+            value = self.translate(stmt.value)
+        return [self.return_(value)]
+
+    def visit_var(self, stmt):
+        self.line = stmt.name.line
+        value = self.constant(None)
+        if stmt.initializer is not None:
+            value = self.translate(stmt.initializer)
+        target = self.store(self.declare(stmt))
+        return [self.at(ast.Assign, targets=[target], value=value)]
+
+    def visit_while(self, stmt):
+        condition = self.condition(stmt.condition)
+        self.loop_depth += 1
+        body = self.body([stmt.body])
+        self.loop_depth -= 1
+        return [self.at(ast.While, test=condition, body=body, orelse=[])]
+
+    def visit_assign(self, expr):
+        value = self.translate(expr.value)
+        self.line = expr.name.line
+        if expr.depth is None:
+            return self.call(
+                "_setglobal", self.constant(f"g_{expr.name.lexeme}"), value
+            )
+        return self.walrus(self.look_up(expr.depth, expr.slot), value)
+
+    def visit_binary(self, expr):
+        left = self.translate(expr.left)
+        right = self.translate(expr.right)
+        op_type = expr.operator.type
+        self.line = expr.operator.line
+        if op_type is TokenType.PLUS:
+            return self.at(
+                ast.BinOp, self.site("add"), left=left, op=ast.Add(), right=right
+            )
+        if op_type in ARITHMETIC_OPS:
+            return self.at(
+                ast.BinOp,
+                self.site("arithmetic"),
+                left=left,
+                op=ARITHMETIC_OPS[op_type](),
+                right=right,
+            )
+        if op_type is TokenType.EQUAL_EQUAL:
+            return self.compare(left, ast.Eq, right)
+        if op_type is TokenType.BANG_EQUAL:
+            return self.compare(left, ast.NotEq, right)
+
+        # Python would compare two strings or repeat a string, so anything but
+        # two floats takes the checked path.
+        a, b = self.temp(), self.temp()
+        if op_type is TokenType.STAR:
+            result = self.at(
+                ast.BinOp, left=self.load(a), op=ast.Mult(), right=self.load(b)
+            )
+        else:
+            result = self.compare(self.load(a), COMPARE_OPS[op_type], self.load(b))
+        return self.at(
+            ast.IfExp,
+            test=self.at(
+                ast.Compare,
+                left=self.call("type", self.walrus(a, left)),
+                ops=[ast.Is(), ast.Is()],
+                comparators=[
+                    self.call("type", self.walrus(b, right)),
+                    self.load("float"),
+                ],
+            ),
+            body=result,
+            orelse=self.at(
+                ast.BoolOp,
+                op=ast.And(),
+                values=[self.call("_check", self.load(a), self.load(b)), result],
+            ),
+        )
+
+    def visit_call(self, call):
+        callee = call.callee
+        count = len(call.arguments)
+        if isinstance(callee, expr.Get):
+            obj, temp = self.receiver(callee.object)
+            self.line = callee.name.line
+            name = callee.name.lexeme
+            function = self.at(
+                ast.Attribute,
+                self.site("get", temp, name),
+                value=obj,
+                attr=f"a_{name}",
+                ctx=ast.Load(),
+            )
+            site = self.site("invoke", temp, count, name)
+        else:
+            temp = self.temp()
+            function = self.walrus(temp, self.translate(callee))
+            site = self.site("call", temp, count)
+        arguments = [self.translate(argument) for argument in call.arguments]
+        self.line = call.paren.line
+        return self.call(function, *arguments, site=site)
+
+    def receiver(self, obj):
+        if isinstance(obj, expr.This):
+            return self.translate(obj), "this"
+        temp = self.temp()
+        return self.walrus(temp, self.translate(obj)), temp
+
+    def visit_get(self, expr):
+        obj, temp = self.receiver(expr.object)
+        self.line = expr.name.line
+        return self.at(
+            ast.Attribute,
+            self.site("get", temp, expr.name.lexeme),
+            value=obj,
+            attr=f"a_{expr.name.lexeme}",
+            ctx=ast.Load(),
+        )
+
+    def visit_grouping(self, expr):
+        return self.translate(expr.expression)
+
+    def visit_literal(self, expr):
+        return self.constant(expr.value)
+
+    def visit_logical(self, expr):
+        if is_bool(expr.left) and is_bool(expr.right):
+            op = ast.Or if expr.operator.type is TokenType.OR else ast.And
+            return self.at(
+                ast.BoolOp,
+                op=op(),
+                values=[self.translate(expr.left), self.translate(expr.right)],
+            )
+
+        temp = self.temp()
+        test = self.is_truthy(self.translate(expr.left), temp)
+        right = self.translate(expr.right)
+        if expr.operator.type is TokenType.OR:
+            return self.at(ast.IfExp, test=test, body=self.load(temp), orelse=right)
+        return self.at(ast.IfExp, test=test, body=right, orelse=self.load(temp))
+
+    def visit_set(self, expr):
+        obj = self.translate(expr.object)
+        self.line = expr.name.line
+        obj = self.call("_instance", obj)
+        value = self.translate(expr.value)
+        self.line = expr.name.line
+        return self.call(
+            "_setattr", obj, self.constant(f"a_{expr.name.lexeme}"), value
+        )
+
+    def visit_super(self, expr):
+        self.line = expr.method.line
+        return self.call(
+            "_super",
+            self.load(self.look_up(expr.depth, 0)),
+            self.load(self.look_up(expr.depth - 1, 0)),
+            self.constant(f"a_{expr.method.lexeme}"),
+        )
+
+    def visit_this(self, expr):
+        return self.load("this")
+
+    def visit_unary(self, expr):
+        right = self.translate(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.type is TokenType.MINUS:
+            return self.at(
+                ast.UnaryOp, self.site("arithmetic"), op=ast.USub(), operand=right
+            )
+        if is_bool(expr.right):
+            return self.at(ast.UnaryOp, op=ast.Not(), operand=right)
+        return self.is_falsey(right, self.temp())
+
+    def visit_variable(self, expr):
+        self.line = expr.name.line
+        if expr.depth is None:
+            name = expr.name.lexeme
+            return self.load(f"g_{name}", self.site("global", name))
+        return self.load(self.look_up(expr.depth, expr.slot))
@@ -0,0 +1,490 @@
+from collections import namedtuple
+from numbers import Number
+
+from .interpreter import Interpreter, RuntimeException
+from .arrays import LoxArray
+from .callable import Callable
+from .chunk import OpCode
+from .compiler import Compiler
+from .lox_class import Instance, LoxClass
+from .natives import NATIVES, NativeError, NativeFunction
+from .object import BoundMethod, Closure, Upvalue
+from .output import Output
+from .rope import STRING_TYPES, concat
+
+
+# Frames are objects on the heap rather than a fixed C array, so this only
+# stops runaway recursion, and allows much deeper recursion than the
+# tree-walker
+FRAMES_MAX = 4096
+
+
+# Runtime errors only know the line of the failing instruction, which is all
+# ErrorReporter.runtime_error needs from a token.
+Location = namedtuple("Location", ["line"])
+
+
+class CallFrame:
+    __slots__ = ("closure", "ip", "base")
+
+    def __init__(self, closure, ip, base):
+        self.closure = closure
+        self.ip = ip
+        self.base = base
+
+
+class VM:
+    def __init__(self, output=None):
+        self.output = Output() if output is None else output
+        self.globals = dict(NATIVES)
+        self.stack = []
+        self.frames = []
+        self.open_upvalues = {}
+
+    def define_global(self, name, value):
+        self.globals[name] = value
+
+    def interpret(self, statements, reporter):
+        function = self.prepare(statements, reporter)
+        if not reporter.had_error:
+            self.run_prepared(function, reporter)
+
+    def prepare(self, statements, reporter):
+        return Compiler(reporter).compile(statements)
+
+    def reset(self, function, output):
+        self.__init__(output)
+
+    def run_prepared(self, function, reporter):
+        closure = Closure(function, [])
+        self.stack = [closure]
+        self.frames = [CallFrame(closure, 0, 0)]
+        try:
+            self.run()
+        except RuntimeException as exc:
+            self.output.flush()
+            reporter.runtime_error(exc)
+            self.stack = []
+            self.frames = []
+            self.open_upvalues = {}
+        finally:
+            self.output.flush()
+
+    def runtime_error(self, message):
+        frame = self.frames[-1]
+        line = frame.closure.function.chunk.get_line(frame.ip - 1)
+        return RuntimeException(Location(line), message)
+
+    def call(self, closure, argc):
+        if argc != closure.function.arity:
+            raise self.runtime_error(
+                f"Expected {closure.function.arity} arguments but got {argc}."
+            )
+        if len(self.frames) == FRAMES_MAX:
+            raise self.runtime_error("Stack overflow.")
+        self.frames.append(CallFrame(closure, 0, len(self.stack) - argc - 1))
+
+    def call_value(self, callee, argc):
+        stack = self.stack
+        if type(callee) is Closure:
+            return self.call(callee, argc)
+        if type(callee) is BoundMethod:
+            stack[-argc - 1] = callee.receiver
+            return self.call(callee.method, argc)
+        if type(callee) is NativeFunction and argc == callee.param_count:
+            arguments = stack[len(stack) - argc :]
+            del stack[len(stack) - argc - 1 :]
+            try:
+                stack.append(callee.call(self, arguments))
+            except NativeError as exc:
+                raise self.runtime_error(str(exc))
+        elif isinstance(callee, LoxClass):
+            stack[-argc - 1] = Instance(callee)
+            if initializer := callee.find_method("init"):
+                return self.call(initializer, argc)
+            if argc != 0:
+                raise self.runtime_error(f"Expected 0 arguments but got {argc}.")
+        elif isinstance(callee, Callable):
+            if argc != callee.arity():
+                raise self.runtime_error(
+                    f"Expected {callee.arity()} arguments but got {argc}."
+                )
+            arguments = stack[len(stack) - argc :]
+            del stack[len(stack) - argc - 1 :]
+            stack.append(callee.call(self, arguments))
+        else:
+            raise self.runtime_error("Can only call functions and classes.")
+
+    def native_callback(self, function, argc):
+        # A Python function with which a native calls a Lox function. Calls
+        # run on a nested run of the loop until the function returns.
+        if type(function) is Closure:
+            arity = function.function.arity
+        elif type(function) is BoundMethod:
+            arity = function.method.function.arity
+        elif isinstance(function, LoxClass):
+            initializer = function.find_method("init")
+            arity = 0 if initializer is None else initializer.function.arity
+        elif isinstance(function, Callable):
+            arity = function.arity()
+        else:
+            raise NativeError("Can only call functions and classes.")
+        if arity != argc:
+            raise NativeError(f"Expected {arity} arguments but got {argc}.")
+
+        def call(*arguments):
+            stop = len(self.frames)
+            self.stack.append(function)
+            self.stack.extend(arguments)
+            self.call_value(function, argc)
+            if len(self.frames) == stop:
+                # A native or a class without an initializer, which are done
+                return self.stack.pop()
+            return self.run(stop)
+
+        return call
+
+    def invoke_from_class(self, class_, name, argc):
+        method = class_.find_method(name)
+        if method is None:
+            raise self.runtime_error(f"Undefined property '{name}'.")
+        return self.call(method, argc)
+
+    def invoke(self, name, argc):
+        receiver = self.stack[-argc - 1]
+        if not isinstance(receiver, Instance):
+            method = self.stack[-argc - 1] = self.array_method(receiver, name)
+            return self.call_value(method, argc)
+        offset = receiver.shape.offsets.get(name)
+        if offset is not None:
+            value = receiver.values[offset]
+            self.stack[-argc - 1] = value
+            return self.call_value(value, argc)
+        return self.invoke_from_class(receiver.class_, name, argc)
+
+    def array_method(self, obj, name):
+        # Arrays are the only values other than instances with properties
+        if type(obj) is LoxArray:
+            method = obj.method(name)
+            if method is None:
+                raise self.runtime_error(f"Undefined property '{name}'.")
+            return method
+        raise self.runtime_error("Only instances have properties.")
+
+    def bind_method(self, class_, name):
+        method = class_.find_method(name)
+        if method is None:
+            raise self.runtime_error(f"Undefined property '{name}'.")
+        self.stack[-1] = BoundMethod(self.stack[-1], method)
+
+    def capture_upvalue(self, index):
+        upvalue = self.open_upvalues.get(index)
+        if upvalue is None:
+            upvalue = self.open_upvalues[index] = Upvalue(index)
+        return upvalue
+
+    def close_upvalues(self, last):
+        for index in [index for index in self.open_upvalues if index >= last]:
+            upvalue = self.open_upvalues.pop(index)
+            upvalue.value = self.stack[index]
+            upvalue.closed = True
+
+    def binary_numbers(self, a, b):
+        if not isinstance(a, Number) or not isinstance(b, Number):
+            raise self.runtime_error("Operand must be a number.")
+        return float(a), float(b)
+
+    def run(self, stop=0):
+        # Runs until the frame count drops back to stop, returning the value
+        # the last frame returned
+        stack = self.stack
+        frames = self.frames
+        globals = self.globals
+        write = self.output.print
+        push = stack.append
+        pop = stack.pop
+        stringify = Interpreter.stringify
+
+        CONSTANT = OpCode.CONSTANT.value
+        NIL = OpCode.NIL.value
+        TRUE = OpCode.TRUE.value
+        FALSE = OpCode.FALSE.value
+        POP = OpCode.POP.value
+        GET_LOCAL = OpCode.GET_LOCAL.value
+        SET_LOCAL = OpCode.SET_LOCAL.value
+        GET_GLOBAL = OpCode.GET_GLOBAL.value
+        DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+        SET_GLOBAL = OpCode.SET_GLOBAL.value
+        GET_UPVALUE = OpCode.GET_UPVALUE.value
+        SET_UPVALUE = OpCode.SET_UPVALUE.value
+        GET_PROPERTY = OpCode.GET_PROPERTY.value
+        SET_PROPERTY = OpCode.SET_PROPERTY.value
+        GET_SUPER = OpCode.GET_SUPER.value
+        EQUAL = OpCode.EQUAL.value
+        NOT_EQUAL = OpCode.NOT_EQUAL.value
+        GREATER = OpCode.GREATER.value
+        GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+        LESS = OpCode.LESS.value
+        LESS_EQUAL = OpCode.LESS_EQUAL.value
+        ADD = OpCode.ADD.value
+        SUBTRACT = OpCode.SUBTRACT.value
+        MULTIPLY = OpCode.MULTIPLY.value
+        DIVIDE = OpCode.DIVIDE.value
+        NOT = OpCode.NOT.value
+        NEGATE = OpCode.NEGATE.value
+        PRINT = OpCode.PRINT.value
+        JUMP = OpCode.JUMP.value
+        JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+        POP_JUMP_IF_FALSE = OpCode.POP_JUMP_IF_FALSE.value
+        LOOP = OpCode.LOOP.value
+        CALL = OpCode.CALL.value
+        INVOKE = OpCode.INVOKE.value
+        SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+        CLOSURE = OpCode.CLOSURE.value
+        CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+        RETURN = OpCode.RETURN.value
+        CLASS = OpCode.CLASS.value
+        INHERIT = OpCode.INHERIT.value
+        METHOD = OpCode.METHOD.value
+
+        # The outer loop loads the state of the current frame into locals and
+        # the inner loop dispatches instructions until a call or return
+        # switches frames, saving the instruction pointer first.
+        while True:
+            frame = frames[-1]
+            closure = frame.closure
+            chunk = closure.function.chunk
+            code = chunk.code
+            constants = chunk.constants
+            base = frame.base
+            ip = frame.ip
+
+            while True:
+                op = code[ip]
+                ip += 1
+
+                if op == GET_LOCAL:
+                    push(stack[base + code[ip]])
+                    ip += 1
+                elif op == CONSTANT:
+                    push(constants[code[ip]])
+                    ip += 1
+                elif op == SET_LOCAL:
+                    stack[base + code[ip]] = stack[-1]
+                    ip += 1
+                elif op == POP:
+                    pop()
+                elif op == GET_GLOBAL:
+                    name = constants[code[ip]]
+                    ip += 1
+                    try:
+                        push(globals[name])
+                    except KeyError:
+                        frame.ip = ip
+                        raise self.runtime_error(f"Undefined variable {name}.")
+                elif op == ADD:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is float and type(b) is float:
+                        stack[-1] = a + b
+                    elif isinstance(a, Number) and isinstance(b, Number):
+                        stack[-1] = float(a) + float(b)
+                    elif isinstance(a, STRING_TYPES) and isinstance(b, STRING_TYPES):
+                        stack[-1] = concat(a, b)
+                    else:
+                        frame.ip = ip
+                        raise self.runtime_error(
+                            "Operands must be two numbers or two strings."
+                        )
+                elif op == SUBTRACT:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a - b
+                elif op == LESS:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a < b
+                elif op == POP_JUMP_IF_FALSE:
+                    value = pop()
+                    if value is None or value is False:
+                        ip += code[ip]
+                    ip += 1
+                elif op == JUMP:
+                    ip += code[ip] + 1
+                elif op == LOOP:
+                    ip -= code[ip] - 1
+                elif op == GET_UPVALUE:
+                    upvalue = closure.upvalues[code[ip]]
+                    ip += 1
+                    push(upvalue.value if upvalue.closed else stack[upvalue.index])
+                elif op == SET_UPVALUE:
+                    upvalue = closure.upvalues[code[ip]]
+                    ip += 1
+                    if upvalue.closed:
+                        upvalue.value = stack[-1]
+                    else:
+                        stack[upvalue.index] = stack[-1]
+                elif op == CALL:
+                    argc = code[ip]
+                    frame.ip = ip + 1
+                    self.call_value(stack[-argc - 1], argc)
+                    break
+                elif op == INVOKE:
+                    name = constants[code[ip]]
+                    argc = code[ip + 1]
+                    frame.ip = ip + 2
+                    self.invoke(name, argc)
+                    break
+                elif op == RETURN:
+                    result = pop()
+                    if self.open_upvalues:
+                        self.close_upvalues(base)
+                    frames.pop()
+                    del stack[base:]
+                    if len(frames) == stop:
+                        return result
+                    push(result)
+                    break
+                elif op == GET_PROPERTY:
+                    instance = stack[-1]
+                    name = constants[code[ip]]
+                    ip += 1
+                    if not isinstance(instance, Instance):
+                        frame.ip = ip
+                        stack[-1] = self.array_method(instance, name)
+                    elif (offset := instance.shape.offsets.get(name)) is not None:
+                        stack[-1] = instance.values[offset]
+                    else:
+                        frame.ip = ip
+                        self.bind_method(instance.class_, name)
+                elif op == SET_PROPERTY:
+                    instance = stack[-2]
+                    ip += 1
+                    if not isinstance(instance, Instance):
+                        frame.ip = ip
+                        raise self.runtime_error("Only instances have fields.")
+                    value = pop()
+                    instance.set_field(constants[code[ip - 1]], value)
+                    stack[-1] = value
+                elif op == MULTIPLY:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a * b
+                elif op == DIVIDE:
+                    b = pop()
+                    a = stack[-1]
+                    frame.ip = ip
+                    a, b = self.binary_numbers(a, b)
+                    if b == 0:
+                        raise self.runtime_error("Division by zero")
+                    stack[-1] = a / b
+                elif op == GREATER:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a > b
+                elif op == LESS_EQUAL:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a <= b
+                elif op == GREATER_EQUAL:
+                    b = pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        frame.ip = ip
+                        a, b = self.binary_numbers(a, b)
+                    stack[-1] = a >= b
+                elif op == EQUAL:
+                    b = pop()
+                    stack[-1] = stack[-1] == b
+                elif op == NOT_EQUAL:
+                    b = pop()
+                    stack[-1] = stack[-1] != b
+                elif op == NIL:
+                    push(None)
+                elif op == TRUE:
+                    push(True)
+                elif op == FALSE:
+                    push(False)
+                elif op == NOT:
+                    value = stack[-1]
+                    stack[-1] = value is None or value is False
+                elif op == NEGATE:
+                    value = stack[-1]
+                    if type(value) is not float:
+                        if not isinstance(value, Number):
+                            frame.ip = ip
+                            raise self.runtime_error("Operand must be a number.")
+                        value = float(value)
+                    stack[-1] = -value
+                elif op == JUMP_IF_FALSE:
+                    value = stack[-1]
+                    if value is None or value is False:
+                        ip += code[ip]
+                    ip += 1
+                elif op == PRINT:
+                    write(stringify(pop()))
+                elif op == DEFINE_GLOBAL:
+                    globals[constants[code[ip]]] = pop()
+                    ip += 1
+                elif op == SET_GLOBAL:
+                    name = constants[code[ip]]
+                    ip += 1
+                    if name not in globals:
+                        frame.ip = ip
+                        raise self.runtime_error(f"Undefined variable {name}.")
+                    globals[name] = stack[-1]
+                elif op == CLOSURE:
+                    function = constants[code[ip]]
+                    ip += 1
+                    upvalues = []
+                    for _ in range(function.upvalue_count):
+                        if code[ip]:
+                            upvalues.append(self.capture_upvalue(base + code[ip + 1]))
+                        else:
+                            upvalues.append(closure.upvalues[code[ip + 1]])
+                        ip += 2
+                    push(Closure(function, upvalues))
+                elif op == CLOSE_UPVALUE:
+                    self.close_upvalues(len(stack) - 1)
+                    pop()
+                elif op == GET_SUPER:
+                    name = constants[code[ip]]
+                    ip += 1
+                    frame.ip = ip
+                    self.bind_method(pop(), name)
+                elif op == SUPER_INVOKE:
+                    name = constants[code[ip]]
+                    argc = code[ip + 1]
+                    frame.ip = ip + 2
+                    self.invoke_from_class(pop(), name, argc)
+                    break
+                elif op == CLASS:
+                    push(LoxClass(constants[code[ip]], None, {}))
+                    ip += 1
+                elif op == INHERIT:
+                    superclass = stack[-2]
+                    if not isinstance(superclass, LoxClass):
+                        frame.ip = ip
+                        raise self.runtime_error("Superclass must be a class.")
+                    subclass = pop()
+                    subclass.superclass = superclass
+                    subclass.methods.update(superclass.methods)
+                elif op == METHOD:
+                    method = pop()
+                    stack[-1].methods[constants[code[ip]]] = method
+                    ip += 1
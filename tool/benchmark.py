@@ -0,0 +1,128 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from plox import lox  # noqa: E402
+
+
+BENCH_DIR = os.path.join(ROOT, "bench")
+
+
+def run_once(name, source, engine, optimize):
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        errors = lox.run(source, engine, optimize)
+    elapsed = time.perf_counter() - start
+    if errors:
+        sys.exit(f"{name} failed on {engine}:\n{output.getvalue()}")
+    return elapsed
+
+
+def measure(name, engine, args):
+    with open(os.path.join(BENCH_DIR, name + ".lox")) as f:
+        source = f.read()
+    for _ in range(args.warmup):
+        run_once(name, source, engine, args.optimize)
+    times = [
+        run_once(name, source, engine, args.optimize) for _ in range(args.repeat)
+    ]
+    return {
+        "benchmark": name,
+        "engine": engine,
+        "median": statistics.median(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "min": min(times),
+        "times": times,
+    }
+
+
+# A result regresses when its median is slower than the baseline's by more
+# than the threshold, and by more than the noise in both measurements.
+def compare(result, baseline, threshold):
+    ratio = result["median"] / baseline["median"]
+    noise = result["stdev"] + baseline["stdev"]
+    result["baseline"] = baseline["median"]
+    result["ratio"] = ratio
+    result["regression"] = (
+        ratio > 1 + threshold and result["median"] - baseline["median"] > noise
+    )
+
+
+# Timings only compare between runs on the same machine, so no baseline is
+# kept in the repository. Record one from the revision to compare against,
+# e.g. on main before a change, with
+#   python tool/benchmark.py --engine vm --engine tree --json baseline.json
+# and then check the change with
+#   python tool/benchmark.py --engine vm --engine tree --baseline baseline.json
+# which exits with status 1 if any benchmark regressed.
+def main():
+    benchmarks = sorted(
+        name[: -len(".lox")] for name in os.listdir(BENCH_DIR) if name.endswith(".lox")
+    )
+    parser = argparse.ArgumentParser(prog="benchmark")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark")
+    parser.add_argument("--engine", action="append", choices=sorted(lox.ENGINES))
+    parser.add_argument("-O", dest="optimize", type=int, default=lox.DEFAULT_OPTIMIZE)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument(
+        "--baseline", metavar="PATH", help="compare against an earlier --json run"
+    )
+    parser.add_argument("--threshold", type=float, default=0.05)
+    args = parser.parse_args()
+    if unknown := sorted(set(args.benchmarks) - set(benchmarks)):
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    baseline = {}
+    if args.baseline:
+        if not os.path.exists(args.baseline):
+            parser.error(f"no baseline at {args.baseline}, record one with --json")
+        with open(args.baseline) as f:
+            for result in json.load(f)["results"]:
+                baseline[result["benchmark"], result["engine"]] = result
+
+    results = []
+    for engine in args.engine or [lox.DEFAULT_ENGINE]:
+        for name in args.benchmarks or benchmarks:
+            result = measure(name, engine, args)
+            line = (
+                f"{name:<18}{engine:<9}{result['median']:8.3f}s"
+                f" ± {result['stdev']:.3f}s"
+            )
+            if (name, engine) in baseline:
+                compare(result, baseline[name, engine], args.threshold)
+                line += f"  {result['ratio']:5.2f}x"
+                if result["regression"]:
+                    line += "  REGRESSION"
+            print(line)
+            results.append(result)
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "optimize": args.optimize,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if any(result.get("regression") for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
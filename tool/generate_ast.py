@@ -5,13 +5,26 @@ import sys
 TAB = 4 * " "
 
 
-def define_type(file, base_name, class_name, field_list):
+def define_type(file, base_name, class_name, field_list, annotation_list):
     file.write(f"class {class_name}({base_name}):\n")
+    # slots double as the fields, in order, for walking and serializing the tree
+    names = [
+        f'"{name.strip()}"'
+        for name in f"{field_list},{annotation_list}".split(",")
+        if name.strip()
+    ]
+    trailing_comma = "," if len(names) == 1 else ""
+    file.write(
+        TAB + f"__slots__ = fields = ({', '.join(names)}{trailing_comma})\n\n"
+    )
     # __init__
     file.write(TAB + f"def __init__(self, {field_list}):\n")
     for field in field_list.split(","):
         name = field.strip()
         file.write(2 * TAB + f"self.{name} = {name}\n")
+    # Annotations are filled in by the Resolver, or by the runtime for caches
+    for annotation in filter(None, annotation_list.split(",")):
+        file.write(2 * TAB + f"self.{annotation.strip()} = None\n")
     file.write("\n")
     # accept
     file.write(TAB + "def accept(self, visitor):\n")
@@ -23,12 +36,15 @@ def define_ast(output_dir, base_name, types):
     path = os.path.join(output_dir, base_name.lower() + ".py")
     with open(path, mode="w") as f:
         f.write(f"class {base_name}:\n")
-        f.write(TAB + "pass\n\n\n")
+        f.write(TAB + "__slots__ = ()\n\n\n")
 
         # The AST classes
         for type in types:
-            class_name, field_list = map(lambda s: s.strip(), type.split(":"))
-            define_type(f, base_name, class_name, field_list)
+            class_name, fields = map(lambda s: s.strip(), type.split(":"))
+            field_list, _, annotation_list = map(
+                lambda s: s.strip(), fields.partition("|")
+            )
+            define_type(f, base_name, class_name, field_list, annotation_list)
 
 
 def main():
@@ -42,18 +58,18 @@ def main():
         output_dir,
         "Expr",
         [
-            "Assign : name, value",
+            "Assign : name, value | depth, slot",
             "Binary : left, operator, right",
-            "Call : callee, paren, arguments",
-            "Get : object, name",
+            "Call : callee, paren, arguments | cache",
+            "Get : object, name | cache",
             "Grouping : expression",
             "Literal : value",
             "Logical : left, operator, right",
-            "Set : object, name, value",
-            "Super : keyword, method",
-            "This : keyword",
+            "Set : object, name, value | cache",
+            "Super : keyword, method | depth, slot, cache",
+            "This : keyword | depth, slot",
             "Unary : operator, right",
-            "Variable : name"
+            "Variable : name | depth, slot",
         ],
     )
 
@@ -61,14 +77,14 @@ def main():
         output_dir,
         "Stmt",
         [
-            "Block : statements",
-            "Class : name, superclass, methods",
+            "Block : statements | size",
+            "Class : name, superclass, methods | slot",
             "Expression : expression",
-            "Function: name, params, body",
+            "Function: name, params, body | slot, size, pure",
             "If : condition, then_branch, else_branch",
             "Print : expression",
             "Return : keyword, value",
-            "Var : name, initializer",
+            "Var : name, initializer | slot",
             "While : condition, body",
         ],
     )
@@ -0,0 +1,81 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plox.errors import ErrorReporter  # noqa: E402
+from plox.parser import Parser  # noqa: E402
+from plox.scanner import Scanner  # noqa: E402
+
+
+OPERATORS = ["+", "-", "*", "/", "<", "<=", ">", ">=", "==", "!=", "and", "or"]
+ATOMS = ["a", "b.c", "f(a, 1)", "1.5", '"s"', "nil", "true", "this.x", "super.m"]
+
+
+def expression(rng, depth):
+    roll = rng.random()
+    if depth > 5 or roll < 0.3:
+        return rng.choice(ATOMS)
+    if roll < 0.4:
+        return rng.choice(["-", "!"]) + expression(rng, depth + 1)
+    if roll < 0.5:
+        return f"({expression(rng, depth + 1)})"
+    if roll < 0.6:
+        return f"{expression(rng, depth + 1)}.f({expression(rng, depth + 1)})"
+    left = expression(rng, depth + 1)
+    right = expression(rng, depth + 1)
+    return f"{left} {rng.choice(OPERATORS)} {right}"
+
+
+# Expression-heavy code, since statements parse the same either way
+def generate(size, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    length = 0
+    while length < size:
+        chunk = (
+            "class C < B {\n"
+            "  m(a, b) {\n"
+            f"    var v = {expression(rng, 0)};\n"
+            f"    if ({expression(rng, 0)}) this.x = {expression(rng, 0)};\n"
+            f"    return {expression(rng, 0)};\n"
+            "  }\n"
+            "}\n"
+            f"print {expression(rng, 0)};\n"
+        )
+        chunks.append(chunk)
+        length += len(chunk)
+    return "".join(chunks)
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) > 1:
+        print("Usage: parse_throughput [script]")
+        sys.exit(64)
+    if args:
+        with open(args[0]) as f:
+            source = f.read()
+    else:
+        source = generate(4_000_000)
+
+    reporter = ErrorReporter(echo=True)
+    tokens = Scanner(source, reporter).scan_tokens()
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        Parser(tokens, reporter).parse()
+        best = min(best, time.perf_counter() - start)
+    if reporter.had_error:
+        sys.exit(65)
+    print(f"{len(source.encode()) / 1e6:.1f} MB, {len(tokens)} tokens")
+    print(
+        f"{len(source.encode()) / best / 1e6:8.2f} MB/s  "
+        f"{len(tokens) / best / 1e6:8.2f} M tokens/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+from argparse import ArgumentParser
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plox import lox  # noqa: E402
+
+
+# Calls, gets and method calls that switch between two classes, which the
+# tree-walker quickens and then has to deoptimize
+SOURCE = """
+class P { init(x) { this.x = x; } get() { return this.x; } }
+class Q { init(x) { this.y = 0; this.x = x; } get() { return this.x + 1; } }
+fun add(a, b) { return a + b; }
+var t = 0;
+for (var i = 0; i < 200; i = i + 1) {
+  var p = P(i);
+  if (i - (i / 2) * 2 == 0) p = Q(i);
+  t = add(t, p.get()) + p.x;
+  var g = p.get;
+  t = t + g();
+}
+print t;
+"""
+
+
+# Runs one Program from several threads at once, which must give every run the
+# output of a run on its own
+def check(engine, threads, runs):
+    program = lox.compile(SOURCE, engine)
+    expected = io.StringIO()
+    program.run(stdout=expected)
+    failures = []
+
+    def worker():
+        for _ in range(runs):
+            out = io.StringIO()
+            try:
+                errors = program.run(stdout=out)
+            except Exception as exc:
+                failures.append(repr(exc))
+                continue
+            if errors or out.getvalue() != expected.getvalue():
+                failures.append(f"{errors} {out.getvalue()!r}")
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return failures
+
+
+def main():
+    parser = ArgumentParser(prog="program_threads")
+    parser.add_argument("--engine", choices=sorted(lox.ENGINES), action="append")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=40)
+    args = parser.parse_args()
+    # Switching threads often makes runs interleave inside single nodes
+    sys.setswitchinterval(1e-6)
+    failed = False
+    for engine in args.engine or sorted(lox.ENGINES):
+        failures = check(engine, args.threads, args.runs)
+        print(f"{engine:<10} {len(failures)} failures")
+        for failure in failures[:3]:
+            print(f"  {failure}")
+        failed = failed or bool(failures)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
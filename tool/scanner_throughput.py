@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plox.errors import ErrorReporter  # noqa: E402
+from plox.scanner import CharacterScanner, Scanner  # noqa: E402
+
+
+SAMPLE = """\
+// A sample of everything the scanner has to deal with
+class Point < Base {
+  init(x, y) {
+    this.x = x;
+    this.y = y;
+  }
+
+  length() {
+    return this.x * this.x + this.y * this.y >= 0.5 and !false;
+  }
+}
+
+fun fib(n) {
+  if (n <= 1) return n;
+  return fib(n - 2) + fib(n - 1);
+}
+
+var greeting = "hello, world";
+for (var i = 0; i < 10; i = i + 1) {
+  print fib(i) / 2 != nil or greeting == "hi";
+}
+"""
+
+
+def throughput(scanner, source, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = scanner(source, ErrorReporter(echo=True)).scan_tokens()
+        best = min(best, time.perf_counter() - start)
+    return len(source.encode()) / best / 1e6, tokens
+
+
+def main():
+    args = sys.argv[1:]
+    if len(args) > 1:
+        print("Usage: scanner_throughput [script]")
+        sys.exit(64)
+    if args:
+        with open(args[0]) as f:
+            source = f.read()
+    else:
+        source = SAMPLE * (4_000_000 // len(SAMPLE))
+
+    print(f"{len(source.encode()) / 1e6:.1f} MB")
+    results = {}
+    for scanner in (CharacterScanner, Scanner):
+        rate, tokens = throughput(scanner, source, 3)
+        results[scanner] = [
+            (token.type, token.lexeme, token.literal, token.line) for token in tokens
+        ]
+        print(f"{scanner.__name__:<18}{rate:8.2f} MB/s  {len(tokens)} tokens")
+    if results[CharacterScanner] != results[Scanner]:
+        print("Token streams differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()